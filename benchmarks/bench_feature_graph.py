@@ -0,0 +1,125 @@
+"""Benchmark of the langchain_version FeatureGraph against the fake model server.
+
+The four depixelization queries of `langchain_version/demo.py` are replayed
+for each combination of `--juniors` and `--concurrency`, and the end-to-end
+latency, the orchestration overhead (time during which the model server was
+idle) and the throughput are reported.
+
+    python benchmarks/bench_feature_graph.py --juniors 1 2 4 8 --concurrency 0 2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "langchain_version"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+
+import src  # noqa: E402
+from demo import queries  # noqa: E402
+from src.agents.clients import clear_clients  # noqa: E402
+
+from fake_llm_server import busy_time, serve  # noqa: E402
+
+
+def run(server, nb_juniors, max_concurrency, use_async, pipeline=False):
+    options = {"base_url": server.url}
+    graph = src.FeatureGraph(
+        nb_juniors=nb_juniors,
+        max_concurrency=max_concurrency or None,
+        agent_options={role: options for role in ("supervisor", "junior", "reviewer")},
+        checkpoint_path=None,
+    )
+
+    latencies, overheads = [], []
+    server.llm.reset()
+    start = time.time()
+    if pipeline:
+        # the queries overlap: only the batch as a whole can be timed
+        with contextlib.redirect_stdout(io.StringIO()):
+            graph.pipeline(queries, session_id="bench")
+        elapsed = time.time() - start
+        model_time = busy_time(server.llm.stats()["intervals"], start)
+        latencies.append(elapsed / len(queries))
+        overheads.append((elapsed - model_time) / len(queries))
+    else:
+        for query in queries:
+            query_start = time.time()
+            # the agents pretty print every answer
+            with contextlib.redirect_stdout(io.StringIO()):
+                if use_async:
+                    asyncio.run(graph.ainvoke(query, session_id="bench"))
+                else:
+                    graph.invoke(query, session_id="bench")
+            query_end = time.time()
+            latency = query_end - query_start
+            model_time = busy_time(
+                server.llm.stats()["intervals"], query_start, query_end
+            )
+            latencies.append(latency)
+            overheads.append(latency - model_time)
+    elapsed = time.time() - start
+
+    stats = server.llm.stats()
+    return {
+        "latency": sum(latencies) / len(latencies),
+        "max_latency": max(latencies),
+        "overhead": sum(overheads) / len(overheads),
+        "queries_per_sec": len(queries) / elapsed,
+        "tokens_per_sec": stats["completion_tokens"] / elapsed,
+        "requests": stats["requests"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--juniors", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="max_concurrency of the graph (0: unbounded)",
+    )
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--sync", action="store_true", help="use invoke, not ainvoke")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="run the queries through FeatureGraph.pipeline",
+    )
+    args = parser.parse_args()
+
+    server = serve(latency=args.latency, token_rate=args.token_rate)
+    os.chdir(tempfile.mkdtemp())
+
+    header = (
+        f"{'juniors':>8}{'concur.':>8}{'latency (s)':>13}{'max (s)':>9}"
+        f"{'overhead (s)':>14}{'query/s':>9}{'tok/s':>9}{'requests':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for nb_juniors in args.juniors:
+        for max_concurrency in args.concurrency:
+            clear_clients()
+            result = run(
+                server, nb_juniors, max_concurrency, not args.sync, args.pipeline
+            )
+            print(
+                f"{nb_juniors:>8}{max_concurrency:>8}{result['latency']:>13.3f}"
+                f"{result['max_latency']:>9.3f}{result['overhead']:>14.3f}"
+                f"{result['queries_per_sec']:>9.2f}{result['tokens_per_sec']:>9.1f}"
+                f"{result['requests']:>10}"
+            )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark of the HTML to markdown extractors of the software_team crawler.
+
+The extractors convert each page of a corpus of saved HTML pages, `--corpus`
+(every *.html file below the directory), or of a synthetic corpus of
+documentation pages when it is not given. The best throughput over
+`--repeat` passes and the peak memory traced by `tracemalloc` during one
+pass are reported. tracemalloc only sees the allocations of Python objects:
+the memory of the lxml tree itself is not included.
+
+    python benchmarks/bench_html_extract.py --pages 200 --repeat 3
+    python benchmarks/bench_html_extract.py --corpus saved_pages/
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "software_team"))
+
+from AISoftTeam.agents.extractor import bs4_extractor, lxml_extractor  # noqa: E402
+
+EXTRACTORS = [bs4_extractor, lxml_extractor]
+
+WORDS = (
+    "the image pixel graph array function returns value color space algorithm "
+    "parameter default shape numpy matplotlib similarity node edge spline"
+).split()
+
+
+def sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def page(rng, sections=8):
+    """A page shaped like a Sphinx documentation page."""
+    nav = "".join(
+        f'<li><a href="/api/{w}.html">{w}</a></li>' for w in rng.sample(WORDS, 15)
+    )
+    body = []
+    for i in range(sections):
+        body.append(
+            f'<section id="s{i}"><h2>Section {i}'
+            f'<a class="headerlink" href="#s{i}">¶</a></h2>'
+        )
+        for _ in range(rng.randint(2, 5)):
+            body.append(
+                f"<p>{sentence(rng)} <code>np.{rng.choice(WORDS)}</code> "
+                f'<a href="/api/{rng.choice(WORDS)}.html">{rng.choice(WORDS)}</a> '
+                f"<em>{rng.choice(WORDS)}</em> {sentence(rng)}</p>"
+            )
+        code = "\n".join(
+            f'    <span class="n">{rng.choice(WORDS)}</span> = '
+            f'<span class="mi">{rng.randint(0, 99)}</span>'
+            for _ in range(rng.randint(3, 12))
+        )
+        body.append(
+            '<div class="highlight-python notranslate"><div class="highlight">'
+            f"<pre>def f():\n{code}\n</pre></div></div>"
+        )
+        items = "".join(f"<li>{sentence(rng, 6)}</li>" for _ in range(4))
+        body.append(f"<ul>{items}</ul>")
+        rows = "".join(
+            f"<tr><td>{rng.choice(WORDS)}</td><td>{sentence(rng, 5)}</td></tr>"
+            for _ in range(5)
+        )
+        body.append(f"<table><tr><th>name</th><th>description</th></tr>{rows}</table>")
+        body.append("</section>")
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        "<title>Documentation</title><style>body { margin: 0 }</style>"
+        '<script src="/static/doc.js"></script></head><body>'
+        '<header><a href="/">Home</a></header>'
+        f'<nav role="navigation"><ul>{nav}</ul></nav>'
+        f'<div class="body" role="main">{"".join(body)}</div>'
+        "<footer>© the authors</footer><script>search()</script></body></html>"
+    )
+
+
+def corpus(path, pages, seed=0):
+    if path is None:
+        rng = random.Random(seed)
+        return [page(rng, sections=rng.randint(2, 16)) for _ in range(pages)]
+    documents = []
+    for filename in sorted(glob.glob(os.path.join(path, "**/*.html"), recursive=True)):
+        with open(filename, encoding="utf-8", errors="replace") as f:
+            documents.append(f.read())
+    return documents
+
+
+def throughput(extractor, documents, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in documents:
+            extractor(document)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(extractor, documents):
+    tracemalloc.start()
+    for document in documents:
+        extractor(document)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of saved HTML pages")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = corpus(args.corpus, args.pages)
+    size = sum(len(document.encode()) for document in documents)
+    print(f"{len(documents)} pages, {size / 2**20:.1f} MiB\n")
+
+    header = (
+        f"{'extractor':<16}{'pages/s':>10}{'MiB/s':>8}{'peak (MiB)':>12}"
+        f"{'output (%)':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for extractor in EXTRACTORS:
+        elapsed = throughput(extractor, documents, args.repeat)
+        peak = peak_memory(extractor, documents)
+        output = sum(len(extractor(document)) for document in documents)
+        print(
+            f"{extractor.__name__:<16}{len(documents) / elapsed:>10.1f}"
+            f"{size / 2**20 / elapsed:>8.2f}{peak / 2**20:>12.2f}"
+            f"{100 * output / size:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Import and graph construction time of both packages.
+
+Each statement is run `--repeat` times in a fresh interpreter; the median wall
+time is reported, minus the startup time of a bare interpreter. `--top` lists
+the modules with the largest cumulative import time (`python -X importtime`).
+
+    python benchmarks/bench_import.py --repeat 5 --top 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    ("langchain_version", "import src"),
+    ("langchain_version", "import src; src.FeatureGraph"),
+    ("langchain_version", "import src; src.FeatureGraph(checkpoint_path=None)"),
+    ("software_team", "import AISoftTeam.agents"),
+    ("software_team", "import AISoftTeam.graph"),
+    ("software_team", "from AISoftTeam.graph import create_small_team as c; c()"),
+    ("software_team", "from AISoftTeam.graph import create_team as c; c()"),
+]
+
+
+def environment():
+    env = dict(os.environ)
+    # the agents read their configuration when they are built: no server is
+    # contacted
+    env.update(
+        OLLAMA_BASE_URL="http://127.0.0.1:11435",
+        OPENAI_API_KEY="fake",
+        SEARCHER_MODEL="fake",
+        ANALYST_MODEL="fake",
+        CODER_MODEL="fake",
+        TESTER_MODEL="fake",
+        EMBED_MODEL="fake",
+    )
+    # the shared package, when it is not installed
+    paths = [os.path.join(ROOT, "common"), env.get("PYTHONPATH", "")]
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, paths))
+    return env
+
+
+def timeit(statement, cwd, env, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", statement],
+            cwd=cwd,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def import_times(statement, cwd, env):
+    """Cumulative import time in µs of the top level packages imported."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    ).stderr
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        # only the top level packages, not their own submodules
+        package = name.split(".")[0]
+        modules[package] = max(modules.get(package, 0), int(cumulative))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0)
+    args = parser.parse_args()
+
+    env = environment()
+    # only the third party packages are listed by --top
+    exclude = set(import_times("pass", ROOT, env)) | {"src", "AISoftTeam"}
+    baseline = timeit("pass", ROOT, env, args.repeat)
+    print(f"interpreter startup: {1000 * baseline:.0f} ms\n")
+
+    header = f"{'statement':<66}{'time (ms)':>10}"
+    print(header)
+    print("-" * len(header))
+    for package, statement in STATEMENTS:
+        cwd = os.path.join(ROOT, package)
+        elapsed = timeit(statement, cwd, env, args.repeat) - baseline
+        print(f"{statement:<66}{1000 * elapsed:>10.0f}")
+        if not args.top:
+            continue
+        modules = import_times(statement, cwd, env)
+        modules = [(m, t) for m, t in modules.items() if m not in exclude]
+        for module, cumulative in sorted(modules, key=lambda item: -item[1])[
+            : args.top
+        ]:
+            print(f"    {module:<62}{cumulative / 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
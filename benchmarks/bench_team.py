@@ -0,0 +1,139 @@
+"""Benchmark of the software_team graphs against the fake model server.
+
+The `create_team` and `create_small_team` flows are run on the queries of
+`langchain_version/demo.py`, with `--jobs` team runs in flight at once. Web
+searches are answered by the local search backend from a synthetic index so
+that no network is used, and cached with `--search-cache`.
+
+    python benchmarks/bench_team.py --jobs 1 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "software_team"))
+sys.path.insert(0, os.path.join(ROOT, "langchain_version"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from fake_llm_server import busy_time, serve  # noqa: E402
+
+
+def search_index(path, n=200):
+    """Write `n` synthetic web results for the local search backend."""
+    words = (
+        "python numpy image processing networkx pixel similarity graph "
+        "matplotlib plot depixelizing art algorithm yuv color space conversion"
+    ).split()
+    documents = [
+        {
+            "title": " ".join(words[(i + k) % len(words)] for k in range(4)),
+            "href": f"https://example.org/{i}",
+            "body": f"Result {i} about " + " ".join(words[i % len(words) :: 3]),
+        }
+        for i in range(n)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(documents, f)
+
+
+def setup(server, search_cache=False):
+    if search_cache:
+        os.environ["SEARCH_CACHE_PATH"] = os.path.join(os.getcwd(), "search.sqlite")
+    os.environ.update(
+        OLLAMA_BASE_URL=server.url,
+        OPENAI_API_KEY="fake",
+        SEARCHER_MODEL="fake",
+        ANALYST_MODEL="fake",
+        CODER_MODEL="fake",
+        TESTER_MODEL="fake",
+        EMBED_MODEL="fake",
+        CHROMA_PERSIST_DIR=os.path.join(os.getcwd(), "chroma"),
+        SEARCH_BACKEND="local",
+        SEARCH_INDEX=os.path.join(os.getcwd(), "search_index.json"),
+    )
+    os.makedirs("output", exist_ok=True)
+    search_index(os.environ["SEARCH_INDEX"])
+
+
+def run(server, create, queries, jobs):
+    graph = create()
+
+    def job(query):
+        start = time.time()
+        graph.invoke({"messages": [HumanMessage(query)]})
+        end = time.time()
+        return end - start, end - start - busy_time(
+            server.llm.stats()["intervals"], start, end
+        )
+
+    server.llm.reset()
+    start = time.time()
+    # the agents print their answers
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(job, queries))
+    elapsed = time.time() - start
+
+    latencies = [latency for latency, _ in results]
+    return {
+        "latency": sum(latencies) / len(latencies),
+        "max_latency": max(latencies),
+        # with several jobs in flight the server is rarely idle: the overhead
+        # is only meaningful with --jobs 1
+        "overhead": sum(overhead for _, overhead in results) / len(results),
+        "runs_per_sec": len(queries) / elapsed,
+        "tokens_per_sec": server.llm.stats()["completion_tokens"] / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument(
+        "--search-cache", action="store_true", help="cache the web search results"
+    )
+    args = parser.parse_args()
+
+    from demo import queries
+
+    server = serve(latency=args.latency, token_rate=args.token_rate)
+    os.chdir(tempfile.mkdtemp())
+    setup(server, args.search_cache)
+
+    from AISoftTeam.graph import create_small_team, create_team
+
+    header = (
+        f"{'flow':<18}{'jobs':>6}{'latency (s)':>13}{'max (s)':>9}"
+        f"{'overhead (s)':>14}{'run/s':>8}{'tok/s':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for create in (create_team, create_small_team):
+        for jobs in args.jobs:
+            result = run(server, create, queries, jobs)
+            print(
+                f"{create.__name__:<18}{jobs:>6}{result['latency']:>13.3f}"
+                f"{result['max_latency']:>9.3f}{result['overhead']:>14.3f}"
+                f"{result['runs_per_sec']:>8.2f}{result['tokens_per_sec']:>9.1f}"
+            )
+    if args.search_cache:
+        from AISoftTeam.search import get_search_cache
+
+        print(f"\nsearch cache: {get_search_cache().stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Local stand-in for an Ollama / OpenAI compatible model server.
+
+The server answers `/api/chat`, `/api/embed` (Ollama) and
+`/v1/chat/completions` (OpenAI) with canned answers shaped like the ones the
+agents of this repository expect. Generation is simulated with a fixed
+prefill latency followed by tokens emitted at a fixed rate, so that the time
+spent in the model is known and the rest of a run is orchestration overhead.
+
+    python benchmarks/fake_llm_server.py --port 11435 --latency 0.2 --token-rate 200
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PYTHON_ANSWER = '''```python
+import numpy as np
+
+
+def solution(image):
+    """
+    Process an image.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        Input image.
+
+    Returns
+    -------
+    np.ndarray
+        Processed image.
+    """
+    return np.asarray(image)
+```'''
+
+SUPERVISOR_ANSWER = """1. CUSTOMER QUERY
+
+    {query}
+
+2. PROJECT
+
+    Build a small image processing function with well known Python packages.
+
+3. SUMMARY
+
+    Implement the requested function, reusing the previously written code.
+
+4. STEPS
+
+    1. Read the input data.
+    2. Transform it as requested.
+    3. Return the result.
+"""
+
+SEARCHER_ANSWER = """```xml
+<root>
+    <web_search id="1">python numpy image processing</web_search>
+    <web_search id="2">networkx pixel similarity graph</web_search>
+    <web_search id="3">matplotlib plot graph over image</web_search>
+    <web_search id="4">depixelizing pixel art algorithm</web_search>
+    <web_search id="5">YUV color space conversion formula</web_search>
+</root>
+```"""
+
+ANALYST_ANSWER = """```xml
+<root>
+    <request>Implement the requested algorithm in Python.</request>
+    <material>The algorithm works on a grid of pixels and a similarity graph.</material>
+    <algorithm id="1">
+        <title>Main function</title>
+        <inputs>An image</inputs>
+        <outputs>The processed image</outputs>
+        <steps>1. Read the image. 2. Process it. 3. Return it.</steps>
+    </algorithm>
+    <tests>1. Check the shape of the output.</tests>
+</root>
+```"""
+
+# answers given when the request constrains the output with a JSON schema
+JSON_ANSWERS = {
+    "You identify a list of web search": json.dumps(
+        {
+            "web_search": [
+                {"query": "python numpy image processing"},
+                {"query": "networkx pixel similarity graph"},
+                {"query": "matplotlib plot graph over image"},
+                {"query": "depixelizing pixel art algorithm"},
+                {"query": "YUV color space conversion formula"},
+            ]
+        },
+        indent=2,
+    ),
+}
+
+# (marker in the prompt, answer): the first matching marker wins
+ANSWERS = [
+    ("DON'T CODE ANYTHING", SUPERVISOR_ANSWER),
+    ("split a coding request", ANALYST_ANSWER),
+    ("You identify a list of web search", SEARCHER_ANSWER),
+    (
+        "test new codes",
+        PYTHON_ANSWER + "\n\n```python\ndef test_solution():\n    pass\n```",
+    ),
+    ("", PYTHON_ANSWER),
+]
+
+
+def tokenize(text):
+    # one "token" per whitespace separated chunk, whitespace included
+    tokens, current = [], ""
+    for char in text:
+        current += char
+        if char.isspace():
+            tokens.append(current)
+            current = ""
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+def prompt_of(messages):
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def embed(text, dim=64):
+    digest = hashlib.sha256(text.encode()).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(dim)]
+
+
+class FakeLLM:
+    """Simulated model: answer selection, timing and statistics."""
+
+    def __init__(self, latency=0.2, token_rate=200.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.intervals = []
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "intervals": list(self.intervals),
+            }
+
+    def answer(self, messages, format=None):
+        prompt = prompt_of(messages)
+        query = str(messages[-1].get("content", "")) if messages else ""
+        for marker, answer in ANSWERS:
+            if marker in prompt:
+                if isinstance(format, dict) and marker in JSON_ANSWERS:
+                    answer = JSON_ANSWERS[marker]
+                return prompt, answer.replace("{query}", query.strip())
+
+    def generate(self, messages, format=None):
+        """Yield the answer tokens with the simulated timing."""
+        start = time.time()
+        prompt, answer = self.answer(messages, format)
+        tokens = tokenize(answer)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(1 / self.token_rate)
+            yield token
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += len(tokenize(prompt))
+            self.completion_tokens += len(tokens)
+            self.intervals.append((start, time.time()))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    llm = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, content_type, chunks):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            data = chunk.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._json(self.llm.stats())
+        elif self.path in ("/", "/api/version"):
+            self._json({"version": "0.0.0"})
+        elif self.path == "/api/tags":
+            self._json({"models": []})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/chat":
+            self._ollama_chat(request)
+        elif self.path == "/v1/chat/completions":
+            self._openai_chat(request)
+        elif self.path == "/api/embed":
+            inputs = request.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._json(
+                {
+                    "model": request.get("model"),
+                    "embeddings": [embed(t) for t in inputs],
+                }
+            )
+        elif self.path == "/api/embeddings":
+            self._json({"embedding": embed(request.get("prompt", ""))})
+        elif self.path == "/reset":
+            self.llm.reset()
+            self._json({})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def _ollama_chat(self, request):
+        model = request.get("model")
+        messages = request.get("messages", [])
+        format = request.get("format")
+
+        def message(content, done=False):
+            return {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+
+        prompt_tokens = len(tokenize(prompt_of(messages)))
+
+        if not request.get("stream", True):
+            tokens = list(self.llm.generate(messages, format))
+            self._json(
+                {
+                    **message("".join(tokens), done=True),
+                    "done_reason": "stop",
+                    "eval_count": len(tokens),
+                    "prompt_eval_count": prompt_tokens,
+                }
+            )
+            return
+
+        def chunks():
+            count = 0
+            for token in self.llm.generate(messages, format):
+                count += 1
+                yield json.dumps(message(token)) + "\n"
+            final = message("", done=True)
+            final.update(
+                done_reason="stop", eval_count=count, prompt_eval_count=prompt_tokens
+            )
+            yield json.dumps(final) + "\n"
+
+        self._stream("application/x-ndjson", chunks())
+
+    def _openai_chat(self, request):
+        model = request.get("model")
+        messages = request.get("messages", [])
+        created = int(time.time())
+        prompt_tokens = len(tokenize(prompt_of(messages)))
+
+        if not request.get("stream", False):
+            tokens = list(self.llm.generate(messages))
+            self._json(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": "".join(tokens),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens),
+                    },
+                }
+            )
+            return
+
+        def chunks():
+            for token in self.llm.generate(messages):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {"index": 0, "delta": {"content": token}, "finish_reason": None}
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        self._stream("text/event-stream", chunks())
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # cancelled generations close their connection while streaming
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(host="127.0.0.1", port=0, latency=0.2, token_rate=200.0):
+    """Start the server in a background thread and return it.
+
+    The simulated model is available as `server.llm` and the base URL as
+    `server.url`.
+    """
+    llm = FakeLLM(latency=latency, token_rate=token_rate)
+    handler = type("FakeLLMHandler", (Handler,), {"llm": llm})
+    server = Server((host, port), handler)
+    server.llm = llm
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def busy_time(intervals, start=None, end=None):
+    """Total time during which at least one request was being generated."""
+    total, current_start, current_end = 0.0, None, None
+    for a, b in sorted(intervals):
+        if start is not None:
+            a = max(a, start)
+        if end is not None:
+            b = min(b, end)
+        if b <= a:
+            continue
+        if current_end is None or a > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = a, b
+        else:
+            current_end = max(current_end, b)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.token_rate)
+    print(f"fake model server listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
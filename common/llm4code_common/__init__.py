@@ -0,0 +1 @@
+"""Code shared by the langchain_version and software_team packages."""
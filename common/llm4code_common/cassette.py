@@ -0,0 +1,264 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import (
+    BaseChatModel,
+    agenerate_from_stream,
+    generate_from_stream,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+class Cassette:
+    """Record/replay store for model and tool calls.
+
+    Every request is hashed together with its `kind` ("chat", "search", ...)
+    and recorded once, with the delays between the streamed chunks, in a
+    gzipped JSON lines file. In "record" mode known requests are replayed and
+    new ones are forwarded and recorded; in "replay" mode a new request raises
+    `CassetteMiss`, so a run never leaves the machine. Replays are instant
+    unless `realtime` is set, in which case the recorded timing is reproduced.
+    """
+
+    def __init__(self, path="cassette.jsonl.gz", mode="record", realtime=False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self._lock = threading.Lock()
+        self._episodes = {}
+
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    episode = json.loads(line)
+                    self._episodes[episode.pop("key")] = episode
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __repr__(self):
+        return f"Cassette({self.path!r}, mode={self.mode!r})"
+
+    def __len__(self):
+        return len(self._episodes)
+
+    @staticmethod
+    def key(kind, request):
+        request = json.dumps([kind, request], sort_keys=True, default=str)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def lookup(self, kind, request):
+        key = self.key(kind, request)
+        with self._lock:
+            episode = self._episodes.get(key)
+        if episode is None and self.mode == "replay":
+            raise CassetteMiss(f"{kind} request {key[:12]} is not in {self.path}")
+        return episode
+
+    def record(self, kind, request, episode):
+        key = self.key(kind, request)
+        line = json.dumps({"key": key, **episode}, separators=(",", ":"), default=str)
+        with self._lock:
+            self._episodes[key] = episode
+            # one gzip member per episode: a crashed run keeps what it recorded
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def wait(self, seconds):
+        if self.realtime and seconds > 0:
+            time.sleep(seconds)
+
+    async def await_(self, seconds):
+        if self.realtime and seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def call(self, kind, request, func):
+        """Return `func()`, or its recorded value for this request.
+
+        The value must be JSON serializable.
+        """
+        episode = self.lookup(kind, request)
+        if episode is not None:
+            self.wait(episode["duration"])
+            return episode["value"]
+        start = time.perf_counter()
+        value = func()
+        self.record(
+            kind,
+            request,
+            {"value": value, "duration": time.perf_counter() - start},
+        )
+        return value
+
+    def wrap(self, llm):
+        """Return the chat or embedding model `llm` recording its calls here."""
+        if isinstance(llm, Embeddings):
+            return CassetteEmbeddings(llm, self)
+        return CassetteChatModel(llm=llm, cassette=self, cache=llm.cache)
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model replaying the answers of `llm` recorded in a `Cassette`.
+
+    Calls are always streamed from the wrapped model so that the recorded
+    episode holds every chunk with its delay from the previous one.
+    """
+
+    llm: BaseChatModel
+    cassette: Any
+
+    @property
+    def _llm_type(self):
+        return f"cassette-{self.llm._llm_type}"
+
+    def _request(self, messages, stop, **kwargs):
+        if hasattr(self.llm, "_chat_params"):
+            # the exact payload sent to Ollama, without the server URL
+            return self.llm._chat_params(messages, stop, **kwargs)
+        return {
+            "llm": self.llm._get_llm_string(stop=stop, **kwargs),
+            "messages": json.loads(dumps(messages)),
+        }
+
+    @staticmethod
+    def _chunk(text):
+        return ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    @staticmethod
+    def _episode(chunks, final):
+        # the text is stored with its timing, the metadata of all the chunks
+        # (usage, done reason...) is merged in a final empty chunk
+        message = final.message if final else None
+        return {
+            "chunks": chunks,
+            "final": {
+                "usage_metadata": getattr(message, "usage_metadata", None),
+                "response_metadata": getattr(message, "response_metadata", {}),
+                "generation_info": final.generation_info if final else None,
+            },
+        }
+
+    @staticmethod
+    def _final(episode):
+        final = episode["final"]
+        message = AIMessageChunk(
+            content="",
+            usage_metadata=final["usage_metadata"],
+            response_metadata=final["response_metadata"],
+        )
+        return ChatGenerationChunk(
+            message=message, generation_info=final["generation_info"]
+        )
+
+    def _stream(
+        self,
+        messages,
+        stop: Optional[list[str]] = None,
+        run_manager=None,
+        **kwargs,
+    ):
+        request = self._request(messages, stop, **kwargs)
+        episode = self.cassette.lookup("chat", request)
+        if episode is not None:
+            for delay, text in episode["chunks"]:
+                self.cassette.wait(delay)
+                chunk = self._chunk(text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+            yield self._final(episode)
+            return
+
+        chunks, final = [], None
+        last = time.perf_counter()
+        for chunk in self.llm._stream(messages, stop=stop, **kwargs):
+            now = time.perf_counter()
+            if chunk.text:
+                chunks.append([round(now - last, 4), chunk.text])
+                last = now
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            final = chunk if final is None else final + chunk
+            yield chunk
+        self.cassette.record("chat", request, self._episode(chunks, final))
+
+    async def _astream(
+        self,
+        messages,
+        stop: Optional[list[str]] = None,
+        run_manager=None,
+        **kwargs,
+    ):
+        request = self._request(messages, stop, **kwargs)
+        episode = self.cassette.lookup("chat", request)
+        if episode is not None:
+            for delay, text in episode["chunks"]:
+                await self.cassette.await_(delay)
+                chunk = self._chunk(text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+            yield self._final(episode)
+            return
+
+        chunks, final = [], None
+        last = time.perf_counter()
+        async for chunk in self.llm._astream(messages, stop=stop, **kwargs):
+            now = time.perf_counter()
+            if chunk.text:
+                chunks.append([round(now - last, 4), chunk.text])
+                last = now
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            final = chunk if final is None else final + chunk
+            yield chunk
+        self.cassette.record("chat", request, self._episode(chunks, final))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return generate_from_stream(
+            self._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await agenerate_from_stream(
+            self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+
+
+class CassetteEmbeddings(Embeddings):
+    """Embedding model replaying the embeddings recorded in a `Cassette`."""
+
+    def __init__(self, embeddings, cassette):
+        self.embeddings = embeddings
+        self.cassette = cassette
+
+    def _request(self, texts):
+        return {"model": getattr(self.embeddings, "model", None), "texts": texts}
+
+    def embed_documents(self, texts):
+        return self.cassette.call(
+            "embed",
+            self._request(texts),
+            lambda: self.embeddings.embed_documents(texts),
+        )
+
+    def embed_query(self, text):
+        return self.cassette.call(
+            "embed_query",
+            self._request(text),
+            lambda: self.embeddings.embed_query(text),
+        )
@@ -0,0 +1,250 @@
+import json
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class MetricsCollector(BaseCallbackHandler):
+    """Callback handler recording per-node metrics of a LangGraph run.
+
+    One record is kept for each node execution with its wall time, the time
+    it waited after its superstep started (`queue_wait`), the number of model
+    calls, prompt/completion tokens, tokens per second, time to first token
+    and retry count. Pass it in the `callbacks` of the run config.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+        self._parents = {}
+        self._nodes = {}
+        self._llm_runs = {}
+        self._step_start = {}
+
+    def _node_of(self, run_id):
+        while run_id is not None and run_id not in self._nodes:
+            run_id = self._parents.get(run_id)
+        return self._nodes.get(run_id)
+
+    def _root_of(self, run_id):
+        while self._parents.get(run_id) is not None:
+            run_id = self._parents[run_id]
+        return run_id
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        now = time.perf_counter()
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            # nested runnables inherit the node metadata: only the run named
+            # after the node is the node itself
+            if node is None or kwargs.get("name") != node:
+                return
+            # concurrent runs of a graph have their own supersteps
+            steps = self._step_start.setdefault(self._root_of(run_id), {})
+            step_start = steps.setdefault(metadata.get("langgraph_step"), now)
+            self._nodes[run_id] = {
+                "node": node,
+                "step": metadata.get("langgraph_step"),
+                "start": time.time(),
+                "_start": now,
+                "queue_wait": now - step_start,
+                "llm_calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "generation_time": 0.0,
+                "ttft": None,
+                "retries": 0,
+                "error": None,
+            }
+
+    def _end_node(self, run_id, error=None):
+        now = time.perf_counter()
+        with self._lock:
+            parent_run_id = self._parents.pop(run_id, None)
+            if parent_run_id is None:
+                # end of a whole run
+                self._step_start.pop(run_id, None)
+            record = self._nodes.pop(run_id, None)
+            if record is None:
+                return
+            record["wall_time"] = now - record.pop("_start")
+            generation_time = record.pop("generation_time")
+            record["tokens_per_sec"] = (
+                record["completion_tokens"] / generation_time
+                if generation_time > 0
+                else None
+            )
+            record["error"] = error
+            self.records.append(record)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_node(run_id, error=repr(error))
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs
+    ):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            self._llm_runs[run_id] = {"start": time.perf_counter(), "ttft": None}
+            record = self._node_of(run_id)
+            if record is not None:
+                record["llm_calls"] += 1
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            llm_run = self._llm_runs.get(run_id)
+            if llm_run is not None and llm_run["ttft"] is None:
+                llm_run["ttft"] = time.perf_counter() - llm_run["start"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        now = time.perf_counter()
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(generation, "message", None)
+                usage = getattr(usage, "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            llm_run = self._llm_runs.pop(run_id, None)
+            record = self._node_of(run_id)
+            self._parents.pop(run_id, None)
+            if record is None or llm_run is None:
+                return
+            self._add_usage(
+                record,
+                prompt_tokens,
+                completion_tokens,
+                now - llm_run["start"],
+                llm_run["ttft"],
+            )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._llm_runs.pop(run_id, None)
+            self._parents.pop(run_id, None)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        with self._lock:
+            record = self._node_of(run_id)
+            if record is not None:
+                record["retries"] += 1
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        # model calls made outside of LangChain report their usage this way
+        if name != "llm_usage":
+            return
+        with self._lock:
+            record = self._node_of(run_id)
+            if record is None:
+                return
+            record["llm_calls"] += data.get("requests", 1)
+            record["retries"] += data.get("retries", 0)
+            self._add_usage(
+                record,
+                data.get("prompt_tokens", 0),
+                data.get("completion_tokens", 0),
+                data.get("duration", 0.0),
+                data.get("ttft"),
+            )
+
+    @staticmethod
+    def _add_usage(record, prompt_tokens, completion_tokens, duration, ttft):
+        record["prompt_tokens"] += prompt_tokens
+        record["completion_tokens"] += completion_tokens
+        record["generation_time"] += duration
+        if ttft is not None and record["ttft"] is None:
+            record["ttft"] = ttft
+
+    def write_jsonl(self, filename):
+        with open(filename, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def aggregate(self):
+        nodes = {}
+        for record in self.records:
+            node = nodes.setdefault(
+                record["node"],
+                {
+                    "runs": 0,
+                    "errors": 0,
+                    "wall_time": [],
+                    "queue_wait": 0.0,
+                    "llm_calls": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "tokens_per_sec": [],
+                    "ttft": [],
+                    "retries": 0,
+                },
+            )
+            node["runs"] += 1
+            node["errors"] += record["error"] is not None
+            node["wall_time"].append(record["wall_time"])
+            node["queue_wait"] += record["queue_wait"]
+            for key in ("llm_calls", "prompt_tokens", "completion_tokens", "retries"):
+                node[key] += record[key]
+            if record["tokens_per_sec"] is not None:
+                node["tokens_per_sec"].append(record["tokens_per_sec"])
+            if record["ttft"] is not None:
+                node["ttft"].append(record["ttft"])
+        return nodes
+
+    def write_prometheus(self, filename, prefix="llm4code"):
+        lines = []
+        metrics = [
+            ("node_runs_total", "counter", lambda n: n["runs"]),
+            ("node_errors_total", "counter", lambda n: n["errors"]),
+            ("node_wall_seconds_sum", "counter", lambda n: sum(n["wall_time"])),
+            ("node_queue_wait_seconds_sum", "counter", lambda n: n["queue_wait"]),
+            ("node_llm_calls_total", "counter", lambda n: n["llm_calls"]),
+            ("node_prompt_tokens_total", "counter", lambda n: n["prompt_tokens"]),
+            (
+                "node_completion_tokens_total",
+                "counter",
+                lambda n: n["completion_tokens"],
+            ),
+            ("node_retries_total", "counter", lambda n: n["retries"]),
+            ("node_ttft_seconds_sum", "counter", lambda n: sum(n["ttft"])),
+        ]
+        nodes = self.aggregate()
+        for name, kind, value in metrics:
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for node, stats in nodes.items():
+                lines.append(f'{prefix}_{name}{{node="{node}"}} {value(stats)}')
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def summary(self):
+        """Return a table with the metrics aggregated by node."""
+
+        def mean(values):
+            return sum(values) / len(values) if values else float("nan")
+
+        header = (
+            f"{'node':<16}{'runs':>6}{'wall (s)':>10}{'p95 (s)':>10}{'wait (s)':>10}"
+            f"{'prompt':>9}{'compl.':>9}{'tok/s':>8}{'ttft (s)':>10}{'retries':>9}"
+        )
+        lines = [header, "-" * len(header)]
+        for node, stats in self.aggregate().items():
+            wall_time = sorted(stats["wall_time"])
+            p95 = wall_time[min(len(wall_time) - 1, int(0.95 * len(wall_time)))]
+            lines.append(
+                f"{node:<16}{stats['runs']:>6}{mean(wall_time):>10.2f}{p95:>10.2f}"
+                f"{stats['queue_wait'] / stats['runs']:>10.2f}"
+                f"{stats['prompt_tokens']:>9}{stats['completion_tokens']:>9}"
+                f"{mean(stats['tokens_per_sec']):>8.1f}{mean(stats['ttft']):>10.2f}"
+                f"{stats['retries']:>9}"
+            )
+        return "\n".join(lines)
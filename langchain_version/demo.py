@@ -30,8 +30,13 @@ Simplify the graph using these 4 criteria:
     """,
 ]
 
-graph = src.FeatureGraph(nb_juniors=1)
+if __name__ == "__main__":
+    metrics = src.MetricsCollector()
+    graph = src.FeatureGraph(nb_juniors=1, metrics=metrics)
 
-for query in queries:
-    print("query: ", query)
-    result = graph.invoke(query)
+    # the supervisor analyses the next query while the current one is coded
+    results = graph.pipeline(queries, session_id="depixelize")
+
+    metrics.write_jsonl("metrics.jsonl")
+    metrics.write_prometheus("metrics.prom")
+    print(metrics.summary())
@@ -1,2 +1,24 @@
-from .agents import *
-from .graph import *
+import importlib
+
+from .agents import __all__ as _agents
+
+# everything is imported on first access, see `agents/__init__.py`
+_exports = {
+    **{name: ".agents" for name in _agents},
+    "FeatureGraph": ".graph",
+    "MetricsCollector": "llm4code_common.metrics",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
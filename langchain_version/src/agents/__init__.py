@@ -1,5 +1,26 @@
-from .supervisor import Supervisor
-from .junior import Junior
-from .reviewer import Reviewer
+import importlib
 
-__all__ = ["Supervisor", "Reviewer", "Junior"]
+# the agents are only imported on first access, so that importing the package
+# does not pull in LangChain, LangGraph and the Ollama client
+_exports = {
+    "Supervisor": ".supervisor",
+    "Junior": ".junior",
+    "Reviewer": ".reviewer",
+    "Validator": ".validator",
+    "ResponseCache": "llm4code_common.cache",
+    "Cassette": "llm4code_common.cassette",
+}
+
+__all__ = ["Supervisor", "Reviewer", "Junior", "Validator", "ResponseCache", "Cassette"]
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,41 @@
+import threading
+import weakref
+
+_clients = {}
+# async HTTP sessions are bound to the event loop they were first used in
+_loop_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def client_key(base_url, model, **options):
+    return (base_url, model, repr(sorted(options.items())))
+
+
+def get_client(model, base_url=None, loop=None, **options):
+    """Return the chat model for this configuration, building it on first use.
+
+    Agents asking for the same (base_url, model, options) share one client and
+    therefore one keep-alive HTTP session to the Ollama server. Clients used
+    from a coroutine are kept per event `loop`. With a `cassette` option the
+    client records its answers in, and replays them from, that `Cassette`.
+    """
+    key = client_key(base_url, model, **options)
+    cassette = options.pop("cassette", None)
+    with _lock:
+        clients = _clients if loop is None else _loop_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            # langchain_ollama is slow to import: only load it when needed
+            from langchain_ollama.chat_models import ChatOllama
+
+            client = ChatOllama(model=model, base_url=base_url, **options)
+            if cassette is not None:
+                client = cassette.wrap(client)
+            clients[key] = client
+    return client
+
+
+def clear_clients():
+    with _lock:
+        _clients.clear()
+        _loop_clients.clear()
@@ -0,0 +1,50 @@
+import logging
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+
+def count_tokens(messages):
+    """Rough token count of a list of messages (about 4 characters per token)."""
+    return sum(len(str(m.content)) // 4 + 4 for m in messages)
+
+
+def compact_messages(messages, max_tokens, token_counter=count_tokens):
+    """Drop the oldest turns so that the messages fit in `max_tokens`.
+
+    The leading system messages and the latest request (the trailing run of
+    human messages) are always kept verbatim; the turns in between are kept
+    from the most recent one backwards as long as they fit in the budget.
+    Older turns are dropped, not summarised.
+    """
+    messages = list(messages)
+    if token_counter(messages) <= max_tokens:
+        return messages
+
+    start = 0
+    while start < len(messages) and isinstance(messages[start], SystemMessage):
+        start += 1
+    end = len(messages)
+    while end > start and isinstance(messages[end - 1], HumanMessage):
+        end -= 1
+    # without a trailing request, the latest message is kept verbatim, unless
+    # it is one of the system messages already kept
+    if end == len(messages) and end > start:
+        end -= 1
+
+    head, history, tail = messages[:start], messages[start:end], messages[end:]
+    budget = max_tokens - token_counter(head) - token_counter(tail)
+
+    kept = []
+    for message in reversed(history):
+        size = token_counter([message])
+        if size > budget:
+            break
+        kept.insert(0, message)
+        budget -= size
+
+    logger.info(
+        f"prompt compacted: dropped {len(history) - len(kept)} of {len(messages)} messages"
+    )
+    return head + kept + tail
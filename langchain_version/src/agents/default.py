@@ -1,13 +1,14 @@
-from langchain_ollama.chat_models import ChatOllama
+import asyncio
+
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from .state import State
 from .utils import read_prompt_from_file
+from .clients import get_client
+from .compaction import compact_messages
 from abc import ABC, abstractmethod
 
-llm = ChatOllama(model="qwen2.5-coder:7b", temperature=0.0, num_ctx=2 * 4096)
-
 
 class DefaultAgent(ABC):
     def __init__(
@@ -16,9 +17,24 @@ class DefaultAgent(ABC):
         temperature=0.0,
         num_ctx=32768,
         prompt=None,
+        base_url=None,
+        cache=None,
+        token_budget=None,
+        cassette=None,
     ):
-        # self.agent = ChatOllama(model=model, temperature=temperature, num_ctx=num_ctx)
-        self.agent = llm
+        self.model = model
+        self.base_url = base_url
+        self.options = {"temperature": temperature, "num_ctx": num_ctx}
+        if cache is not None:
+            # optional `ResponseCache` replaying identical prompts
+            self.options["cache"] = cache
+        if cassette is not None:
+            # optional `Cassette` recording or replaying every model call
+            self.options["cassette"] = cassette
+        self._agent = None
+        # prompts are compacted to this many tokens before every call, leaving
+        # the rest of the context window for the answer
+        self.token_budget = token_budget or 3 * num_ctx // 4
 
         messages = [
             MessagesPlaceholder(variable_name="messages"),
@@ -27,6 +43,51 @@ class DefaultAgent(ABC):
             messages.insert(0, SystemMessage(read_prompt_from_file(prompt)))
         self.prompt_template = ChatPromptTemplate.from_messages(messages)
 
+    @property
+    def agent(self):
+        # the client is only resolved on first use so that building agents
+        # and graphs does not touch the model server
+        if self._agent is not None:
+            return self._agent
+        return get_client(self.model, self.base_url, **self.options)
+
+    @property
+    def async_agent(self):
+        if self._agent is not None:
+            return self._agent
+        loop = asyncio.get_running_loop()
+        return get_client(self.model, self.base_url, loop=loop, **self.options)
+
+    @agent.setter
+    def agent(self, agent):
+        self._agent = agent
+
+    @staticmethod
+    def _strip(message):
+        # the graph gives every message a random id and the model answers
+        # carry their timings: both are part of the prompt serialized as the
+        # response cache key, so only the role and the content are kept
+        update = {"id": None, "response_metadata": {}, "additional_kwargs": {}}
+        if "usage_metadata" in type(message).model_fields:
+            update["usage_metadata"] = None
+        return message.model_copy(update=update)
+
+    def _compact(self, prompt):
+        messages = compact_messages(prompt.to_messages(), self.token_budget)
+        return [self._strip(message) for message in messages]
+
+    def call_llm(self, messages):
+        prompt = self.prompt_template.invoke({"messages": messages})
+        return self.agent.invoke(self._compact(prompt))
+
+    async def acall_llm(self, messages):
+        prompt = await self.prompt_template.ainvoke({"messages": messages})
+        return await self.async_agent.ainvoke(self._compact(prompt))
+
     @abstractmethod
     def invoke(self, state: State):
         pass
+
+    @abstractmethod
+    async def ainvoke(self, state: State):
+        pass
@@ -4,6 +4,8 @@ from langchain_core.messages import HumanMessage
 
 from .state import State
 from .default import DefaultAgent
+from .patch import PATCH_INSTRUCTIONS, extract_patch, patch_version
+from .utils import extract_code
 
 logger = logging.getLogger(__name__)
 
@@ -15,27 +17,56 @@ class Junior(DefaultAgent):
         temperature=0.0,
         num_ctx=32768,
         prompt=os.path.join(os.path.dirname(__file__), "junior.md"),
+        patch_mode=False,
+        **kwargs,
     ):
         super().__init__(
-            model=model, temperature=temperature, num_ctx=num_ctx, prompt=prompt
+            model=model,
+            temperature=temperature,
+            num_ctx=num_ctx,
+            prompt=prompt,
+            **kwargs,
         )
+        # answer with a diff against the current code instead of the whole file
+        self.patch_mode = patch_mode
 
-    def invoke(self, state: State):
-        logger.info("start junior")
-        prompt = self.prompt_template.invoke(
-            {
-                "messages": state["messages"][:-1]
-                + [
-                    HumanMessage(state["messages"][-1].content),
-                    HumanMessage(
-                        f"You have to add your code to the following existing code:\n{state['current_code']}"
-                    ),
-                ]
-            }
+    def _messages(self, state: State):
+        code = HumanMessage(
+            f"You have to add your code to the following existing code:\n{state['current_code']}"
         )
-        response = self.agent.invoke(prompt)
+        if self.patch_mode:
+            version = state.get("code_version", 0)
+            code.content += PATCH_INSTRUCTIONS.format(version=version)
+        return state["messages"][:-1] + [
+            HumanMessage(state["messages"][-1].content),
+            code,
+        ]
+
+    def usable(self, solution, version=None):
+        """Check that a solution holds code (or a diff in patch mode).
 
+        In patch mode, the diff must be written against the `version` of the
+        current code when it is given.
+        """
+        if self.patch_mode:
+            diff = extract_patch(solution)
+            if version is not None and patch_version(diff) != version:
+                return False
+            return bool(diff.strip())
+        return bool(extract_code(solution).strip())
+
+    def _answer(self, response):
         logger.debug(response.pretty_print())
         logger.info("end junior")
 
         return {"solutions": [response.content]}
+
+    def invoke(self, state: State):
+        logger.info("start junior")
+        response = self.call_llm(self._messages(state))
+        return self._answer(response)
+
+    async def ainvoke(self, state: State):
+        logger.info("start junior")
+        response = await self.acall_llm(self._messages(state))
+        return self._answer(response)
@@ -0,0 +1,112 @@
+import ast
+import re
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+VERSION_HEADER = re.compile(r"^--- .*\bversion (\d+)", re.MULTILINE)
+
+
+PATCH_INSTRUCTIONS = """
+Don't rewrite the whole code: answer only with a unified diff against the
+current code (version {version}) in a single ```diff block. Start the diff
+with the header `--- current_code version {version}`, use `@@` hunk headers
+with the line numbers of the current code and keep 3 lines of context around
+each change.
+"""
+
+
+class PatchError(ValueError):
+    pass
+
+
+def extract_patch(content):
+    """Return the unified diff found in the ```diff blocks of an answer."""
+    pattern = re.compile(r"```(?:diff|patch)\n(.*?)\n```", re.DOTALL)
+    return "\n".join(pattern.findall(content))
+
+
+def patch_version(diff):
+    """Return the version of the code a diff applies to, or None."""
+    match = VERSION_HEADER.search(diff)
+    return int(match.group(1)) if match else None
+
+
+def parse_hunks(diff):
+    """Split a unified diff into (start, old_lines, new_lines) hunks."""
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+        elif current is None or line.startswith(("---", "+++")):
+            continue
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current[1].append(line[1:])
+            current[2].append(line[1:])
+        elif line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        else:
+            raise PatchError(f"unexpected line in diff: {line!r}")
+    return hunks
+
+
+def _find(lines, block, hint, start):
+    # models get line numbers wrong more often than context, so look for the
+    # block at the announced line first, then anywhere after the last hunk
+    if lines[hint : hint + len(block)] == block:
+        return hint
+    for i in range(start, len(lines) - len(block) + 1):
+        if lines[i : i + len(block)] == block:
+            return i
+    return None
+
+
+def apply_patch(code, diff, version=None):
+    """Apply a unified diff to `code` and return the patched code.
+
+    Raises `PatchError` when the diff has no hunk or a hunk does not match,
+    and, when the `version` of `code` is given, when the diff was not written
+    against this version.
+    """
+    if version is not None:
+        base = patch_version(diff)
+        if base is None:
+            raise PatchError("the diff does not give the version of its code")
+        if base != version:
+            raise PatchError(
+                f"the diff applies to version {base}, the code is version {version}"
+            )
+    hunks = parse_hunks(diff)
+    if not hunks:
+        raise PatchError("no hunk found in diff")
+
+    lines = code.splitlines()
+    position = 0
+    for start, old, new in hunks:
+        if not old:
+            # pure insertion: the hunk starts after line `start`
+            index = min(start, len(lines))
+        else:
+            index = _find(lines, old, max(start - 1, 0), position)
+            if index is None:
+                raise PatchError(f"hunk at line {start} does not match the code")
+        lines[index : index + len(old)] = new
+        position = index + len(new)
+
+    return "\n".join(lines) + "\n"
+
+
+def apply_and_validate(code, diff, version=None):
+    """Apply `diff` to `code` and check that the result is valid Python."""
+    patched = apply_patch(code, diff, version)
+    try:
+        ast.parse(patched)
+    except SyntaxError as e:
+        raise PatchError(f"patched code is not valid Python: {e}") from e
+    return patched
@@ -4,7 +4,8 @@ from langchain_core.messages import HumanMessage
 
 from .state import State
 from .default import DefaultAgent
-from .utils import extract_and_write_code
+from .utils import archive_solutions, extract_code, write_code
+from .patch import PATCH_INSTRUCTIONS, PatchError, apply_and_validate, extract_patch
 
 logger = logging.getLogger(__name__)
 
@@ -16,19 +17,40 @@ class Reviewer(DefaultAgent):
         temperature=0.0,
         num_ctx=32768,
         prompt=os.path.join(os.path.dirname(__file__), "reviewer.md"),
+        archive=None,
+        patch_mode=False,
+        **kwargs,
     ):
         super().__init__(
-            model=model, temperature=temperature, num_ctx=num_ctx, prompt=prompt
+            model=model,
+            temperature=temperature,
+            num_ctx=num_ctx,
+            prompt=prompt,
+            **kwargs,
         )
         self.ite = 0
+        # optional JSON lines file keeping the solutions of past rounds
+        self.archive = archive
+        # exchange unified diffs against the current code instead of whole files
+        self.patch_mode = patch_mode
 
-    def invoke(self, state: State):
-        logger.info("start reviewer")
+    def _solutions(self, state: State):
+        solutions = state["solutions"]
+        validation = state.get("validation")
+        if validation:
+            # only the solutions that passed the validation are worth reviewing
+            solutions = [s for s, v in zip(solutions, validation) if v["ok"]]
+            if not solutions:
+                errors = "\n".join(f"- {v['stage']}: {v['error']}" for v in validation)
+                return f"no solution of your team could run:\n{errors}"
 
-        solutions = "\n\n".join(
-            [f"solution for Agent {i}:\n {s}" for i, s in enumerate(state["solutions"])]
+        return "\n\n".join(
+            [f"solution for Agent {i}:\n {s}" for i, s in enumerate(solutions)]
         )
 
+    def _messages(self, state: State):
+        solutions = self._solutions(state)
+
         message = f"""
 The work of your team is resumed in the following
 {solutions}
@@ -37,18 +59,62 @@ The current code is:
 {state['current_code']}
 
         """
+        if self.patch_mode:
+            version = state.get("code_version", 0)
+            message += PATCH_INSTRUCTIONS.format(version=version)
 
-        prompt = self.prompt_template.invoke(
-            {"messages": state["messages"] + [HumanMessage(message)]}
-        )
-        response = self.agent.invoke(prompt)
+        return state["messages"] + [HumanMessage(message)]
 
-        current_code = extract_and_write_code(
-            response.content, f"current_code_{self.ite}.py"
-        )
+    def _patch(self, state: State, content):
+        """Return the patched code, or None and the failure of the patch."""
+        version = state.get("code_version", 0)
+        try:
+            code = apply_and_validate(
+                state["current_code"], extract_patch(content), version
+            )
+        except PatchError as e:
+            logger.warning(f"reviewer patch rejected: {e}")
+            if "```python" in content:
+                # the model answered with the whole file after all
+                return extract_code(content), None
+            return None, {"ok": False, "stage": "patch", "error": str(e)}
+        return code, None
+
+    def _answer(self, state: State, response):
+        failure = None
+        if self.patch_mode:
+            current_code, failure = self._patch(state, response.content)
+        else:
+            current_code = extract_code(response.content)
+        filename = f"current_code_{self.ite}.py"
         self.ite += 1
 
+        # the solutions are only needed for this round: drop them from the state
+        update = {"messages": response, "solutions": None}
+        if failure is not None:
+            # the code is left unchanged: the failure is reported with the
+            # validation of the solutions
+            update["validation"] = list(state.get("validation") or []) + [failure]
+            logger.info("end reviewer")
+            return update
+
+        write_code(current_code, filename)
+        if self.archive:
+            archive_solutions(self.archive, state["solutions"], current_code)
+
         logger.debug(current_code)
         logger.info("end reviewer")
 
-        return {"messages": response, "current_code": current_code}
+        update["current_code"] = current_code
+        update["code_version"] = state.get("code_version", 0) + 1
+        return update
+
+    def invoke(self, state: State):
+        logger.info("start reviewer")
+        response = self.call_llm(self._messages(state))
+        return self._answer(state, response)
+
+    async def ainvoke(self, state: State):
+        logger.info("start reviewer")
+        response = await self.acall_llm(self._messages(state))
+        return self._answer(state, response)
@@ -2,10 +2,22 @@ from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 from typing_extensions import Annotated, TypedDict
 from typing import Sequence
-import operator
+
+
+def add_solutions(left, right):
+    """Collect the junior solutions of the current review round.
+
+    Writing `None` to the channel starts a new round and evicts the
+    solutions of the previous one.
+    """
+    if right is None:
+        return []
+    return (left or []) + right
 
 
 class State(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     current_code: BaseMessage
-    solutions: Annotated[list, operator.add]
+    code_version: int
+    solutions: Annotated[list, add_solutions]
+    validation: list
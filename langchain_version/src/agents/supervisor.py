@@ -14,18 +14,28 @@ class Supervisor(DefaultAgent):
         temperature=0.0,
         num_ctx=32768,
         prompt=os.path.join(os.path.dirname(__file__), "supervisor.md"),
+        **kwargs,
     ):
         super().__init__(
-            model=model, temperature=temperature, num_ctx=num_ctx, prompt=prompt
+            model=model,
+            temperature=temperature,
+            num_ctx=num_ctx,
+            prompt=prompt,
+            **kwargs,
         )
 
-    def invoke(self, state: State):
-        logger.info("start supervisor")
-
-        prompt = self.prompt_template.invoke({"messages": [state["messages"][-1]]})
-        response = self.agent.invoke(prompt)
-
+    def _answer(self, response):
         logger.debug(response.pretty_print())
         logger.info("end supervisor")
 
         return {"messages": response}
+
+    def invoke(self, state: State):
+        logger.info("start supervisor")
+        response = self.call_llm([state["messages"][-1]])
+        return self._answer(response)
+
+    async def ainvoke(self, state: State):
+        logger.info("start supervisor")
+        response = await self.acall_llm([state["messages"][-1]])
+        return self._answer(response)
@@ -1,4 +1,6 @@
+import json
 import re
+import time
 
 
 def read_prompt_from_file(file_path):
@@ -6,16 +8,29 @@ def read_prompt_from_file(file_path):
         return file.read()
 
 
-def extract_and_write_code(content, filename):
+def extract_code(content):
     # Regex to match ```python ... ```
     pattern = re.compile(r"```python\n(.*?)\n```", re.DOTALL)
     code_blocks = pattern.findall(content)
 
     # Combine extracted code
-    extracted_code = "\n\n".join(code_blocks)
+    return "\n\n".join(code_blocks)
+
+
+def extract_and_write_code(content, filename):
+    return write_code(extract_code(content), filename)
 
+
+def write_code(code, filename):
     # Save to a Python file
     with open(filename, "w", encoding="utf-8") as f:
-        f.write(extracted_code)
+        f.write(code)
+
+    return code
+
 
-    return extracted_code
+def archive_solutions(filename, solutions, code):
+    # Append one review round to a JSON lines file
+    with open(filename, "a", encoding="utf-8") as f:
+        record = {"time": time.time(), "solutions": solutions, "code": code}
+        f.write(json.dumps(record) + "\n")
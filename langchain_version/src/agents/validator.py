@@ -0,0 +1,153 @@
+import ast
+import asyncio
+import atexit
+import functools
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from .state import State
+from .patch import PatchError, apply_patch, extract_patch
+from .utils import extract_code
+
+logger = logging.getLogger(__name__)
+
+# run the candidate as a module (not as __main__) so that only its imports
+# and definitions are executed
+SMOKE_RUNNER = "import runpy, sys; runpy.run_path(sys.argv[1], run_name='__smoke__')"
+
+
+def _limit_resources(cpu_time, memory):
+    if resource is None:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time))
+    if memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def check_code(code, timeout=10, cpu_time=10, memory=2 * 2**30):
+    """Parse `code` and smoke-run it in a resource limited interpreter.
+
+    Returns a dictionary with `ok`, the `stage` that failed (`parse` or
+    `run`, or `extract` and `patch` in `check_solution`) and the `error`
+    message.
+    """
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        return {"ok": False, "stage": "parse", "error": str(e)}
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(code)
+    try:
+        process = subprocess.run(
+            [sys.executable, "-c", SMOKE_RUNNER, f.name],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            env={**os.environ, "MPLBACKEND": "Agg"},
+            preexec_fn=lambda: _limit_resources(cpu_time, memory),
+        )
+    except subprocess.TimeoutExpired:
+        return {"ok": False, "stage": "run", "error": f"timeout after {timeout}s"}
+    finally:
+        os.remove(f.name)
+
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines() or [
+            f"exit code {process.returncode}"
+        ]
+        return {"ok": False, "stage": "run", "error": lines[-1]}
+    return {"ok": True, "stage": None, "error": None}
+
+
+def check_solution(current_code, solution, patch_mode=False, version=None, **limits):
+    """Check the code obtained by completing `current_code` with `solution`.
+
+    In patch mode, the diff must apply to the `version` of `current_code`.
+    """
+    if patch_mode:
+        try:
+            code = apply_patch(current_code, extract_patch(solution), version)
+        except PatchError as e:
+            return {"ok": False, "stage": "patch", "error": str(e)}
+    else:
+        solution_code = extract_code(solution)
+        # the current code alone would pass
+        if not solution_code.strip():
+            return {"ok": False, "stage": "extract", "error": "no python code block"}
+        code = f"{current_code}\n\n{solution_code}"
+    return check_code(code, **limits)
+
+
+class Validator:
+    """Graph stage checking the junior solutions before the review.
+
+    Each candidate (the current code completed by a solution) is parsed and
+    smoke-run in its own resource limited subprocess, started from a thread
+    pool; the results are stored in `validation` and the reviewer only reads
+    the candidates that passed.
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        timeout=10,
+        cpu_time=10,
+        memory=2 * 2**30,
+        patch_mode=False,
+    ):
+        self.max_workers = max_workers
+        self.limits = {"timeout": timeout, "cpu_time": cpu_time, "memory": memory}
+        self.patch_mode = patch_mode
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            atexit.register(self.close)
+        return self._pool
+
+    def close(self):
+        """Shut down the thread pool."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _check(self, state: State):
+        return functools.partial(
+            check_solution,
+            state["current_code"],
+            patch_mode=self.patch_mode,
+            version=state.get("code_version", 0),
+            **self.limits,
+        )
+
+    def _answer(self, results):
+        logger.info(f"{sum(r['ok'] for r in results)}/{len(results)} solutions valid")
+        logger.info("end validation")
+
+        return {"validation": results}
+
+    def invoke(self, state: State):
+        logger.info("start validation")
+        results = list(self.pool.map(self._check(state), state["solutions"]))
+        return self._answer(results)
+
+    async def ainvoke(self, state: State):
+        logger.info("start validation")
+        loop = asyncio.get_running_loop()
+        check = self._check(state)
+        results = await asyncio.gather(
+            *[loop.run_in_executor(self.pool, check, s) for s in state["solutions"]]
+        )
+        return self._answer(list(results))
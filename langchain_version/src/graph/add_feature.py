@@ -1,43 +1,285 @@
-from langgraph.checkpoint.memory import MemorySaver
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 from langgraph.graph import START, StateGraph
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, RemoveMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.types import Send
 
-from ..agents import Supervisor, Junior, Reviewer
+from ..agents import Supervisor, Junior, Reviewer, Validator
+from ..agents.compaction import compact_messages
 from ..agents.state import State
+from .memory import LocalMemorySaver
+
+logger = logging.getLogger(__name__)
+
+
+def run_sync(coroutine):
+    """Run `coroutine` to completion from synchronous code.
+
+    `asyncio.run` cannot be called from a thread whose loop is already
+    running (Jupyter, async callers of `invoke`): the coroutine then runs on
+    a loop of its own in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
 
 
 class FeatureGraph:
-    def __init__(self, nb_juniors=2):
+    def __init__(
+        self,
+        nb_juniors=2,
+        max_concurrency=None,
+        agent_options=None,
+        cache=None,
+        cassette=None,
+        solutions_archive=None,
+        checkpoint_path=None,
+        keep_checkpoints=20,
+        patch_mode=False,
+        first_k=None,
+        junior_deadline=None,
+        validate=False,
+        validation_options=None,
+        metrics=None,
+        history_budget=None,
+    ):
         self.nb_juniors = nb_juniors
-        self.supervisor = Supervisor()
-        self.junior = Junior()
-        self.reviewer = Reviewer()
+        # speculative fan-out: review as soon as `first_k` usable solutions
+        # are in, and cancel the juniors still running after `junior_deadline`
+        # seconds or once enough solutions arrived
+        self.first_k = first_k
+        self.junior_deadline = junior_deadline
+        # upper bound on the number of junior generations running at once
+        # when the graph is driven through `ainvoke`/`astream`
+        self.max_concurrency = max_concurrency
+        # per-role model configuration, e.g.
+        # {"junior": {"num_ctx": 8192}, "reviewer": {"num_ctx": 32768}}
+        agent_options = agent_options or {}
+        # `cache` and `cassette` are shared by all the agents
+        shared = {"cache": cache, "cassette": cassette}
+        self.supervisor = Supervisor(**shared, **agent_options.get("supervisor", {}))
+        # with `patch_mode`, juniors and reviewer exchange unified diffs
+        # against the current code so output tokens scale with the change
+        self.junior = Junior(
+            **shared, patch_mode=patch_mode, **agent_options.get("junior", {})
+        )
+        self.reviewer = Reviewer(
+            **shared,
+            archive=solutions_archive,
+            patch_mode=patch_mode,
+            **agent_options.get("reviewer", {}),
+        )
+
+        # sessions only live in memory unless `checkpoint_path` is given, in
+        # which case they are persisted in a local SQLite database and a run
+        # with the same session id resumes the previous one; both keep the
+        # `keep_checkpoints` most recent checkpoints of a session
+        if checkpoint_path is None:
+            self.memory = LocalMemorySaver()
+        else:
+            from .checkpoint import LocalSaver
 
-        self.memory = MemorySaver()
+            self.memory = LocalSaver(checkpoint_path)
+        self.keep_checkpoints = keep_checkpoints
+        # the message history of a session is compacted to this many tokens
+        # before every query; by default, the largest prompt budget of the
+        # agents, beyond which the history is never sent again
+        self.history_budget = history_budget or max(
+            agent.token_budget
+            for agent in (self.supervisor, self.junior, self.reviewer)
+        )
+        # optional `MetricsCollector` recording per-node metrics of every run
+        self.metrics = metrics
 
         self.graph = StateGraph(state_schema=State)
         self.graph.add_edge(START, "analyse")
-        self.graph.add_edge("analyse", "junior")
-        self.graph.add_conditional_edges("analyse", self.send_to_junior, ["junior"])
-        self.graph.add_edge("junior", "reviewing")
+        if validate:
+            # parse and smoke-run the solutions before spending a review on them
+            self.validator = Validator(
+                patch_mode=patch_mode, **(validation_options or {})
+            )
+            self.graph.add_node("validate", self._node(self.validator))
+            self.graph.add_edge("junior", "validate")
+            self.graph.add_edge("validate", "reviewing")
+        else:
+            self.graph.add_edge("junior", "reviewing")
 
-        self.graph.add_node("analyse", self.supervisor.invoke)
-        self.graph.add_node("junior", self.junior.invoke)
-        self.graph.add_node("reviewing", self.reviewer.invoke)
+        self.graph.add_node("analyse", self._node(self.supervisor))
+        if first_k is None and junior_deadline is None:
+            self.graph.add_conditional_edges("analyse", self.send_to_junior, ["junior"])
+            self.graph.add_node("junior", self._node(self.junior))
+        else:
+            self.graph.add_edge("analyse", "junior")
+            self.graph.add_node(
+                "junior", RunnableLambda(self.fan_out, afunc=self.afan_out)
+            )
+        self.graph.add_node("reviewing", self._node(self.reviewer))
         self.app = self.graph.compile(checkpointer=self.memory)
-        self.current_code = ""
+
+    @staticmethod
+    def _node(agent):
+        return RunnableLambda(agent.invoke, afunc=agent.ainvoke)
 
     def send_to_junior(self, state: State):
         return [Send("junior", state) for i in range(self.nb_juniors)]
 
-    def invoke(self, query):
-        config = {"configurable": {"thread_id": "abc123"}}
+    def fan_out(self, state: State):
+        return run_sync(self.afan_out(state))
+
+    async def afan_out(self, state: State):
+        first_k = self.first_k or self.nb_juniors
+        semaphore = asyncio.Semaphore(self.max_concurrency or self.nb_juniors)
+
+        async def junior():
+            async with semaphore:
+                return await self.junior.ainvoke(state)
+
+        loop = asyncio.get_running_loop()
+        deadline = None
+        if self.junior_deadline is not None:
+            deadline = loop.time() + self.junior_deadline
+
+        version = state.get("code_version", 0)
+        solutions = []
+        pending = {asyncio.create_task(junior()) for i in range(self.nb_juniors)}
+        try:
+            while pending and len(solutions) < first_k:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    logger.warning("junior deadline reached")
+                    break
+                for task in done:
+                    if task.exception() is not None:
+                        logger.warning(f"junior failed: {task.exception()!r}")
+                        continue
+                    for solution in task.result()["solutions"]:
+                        if self.junior.usable(solution, version):
+                            solutions.append(solution)
+        finally:
+            # free the model server from the generations we no longer need
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        solutions = solutions[:first_k]
+        logger.info(
+            f"{len(solutions)} solutions kept, {len(pending)} juniors cancelled"
+        )
+        return {"solutions": solutions}
+
+    def _config(self, session_id):
+        config = {"configurable": {"thread_id": session_id}}
+        if self.max_concurrency is not None:
+            config["max_concurrency"] = self.max_concurrency
+        if self.metrics is not None:
+            config["callbacks"] = [self.metrics]
+        return config
 
+    def _trim(self, values):
+        """Messages removing the oldest turns of the session history."""
+        history = values.get("messages", [])
+        kept = {id(m) for m in compact_messages(history, self.history_budget)}
+        return [RemoveMessage(id=m.id) for m in history if id(m) not in kept]
+
+    def _input(self, messages, values):
         state = {
-            "messages": [HumanMessage(content=query)],
-            "current_code": self.current_code,
+            "messages": self._trim(values) + messages,
+            "solutions": None,
+            "validation": [],
         }
-        response = self.app.invoke(state, config)
-        self.current_code = state["current_code"]
+        # the reviewed code of a session is carried over by its checkpoints
+        if "current_code" not in values:
+            state["current_code"] = ""
+        return state
+
+    def _prune(self, session_id):
+        if self.keep_checkpoints and hasattr(self.memory, "prune"):
+            self.memory.prune(self.keep_checkpoints, thread_id=session_id)
+
+    def invoke(self, query, session_id="default"):
+        config = self._config(session_id)
+        values = self.app.get_state(config).values
+        response = self.app.invoke(
+            self._input([HumanMessage(content=query)], values), config
+        )
+        self._prune(session_id)
         return response
+
+    async def ainvoke(self, query, session_id="default"):
+        config = self._config(session_id)
+        values = (await self.app.aget_state(config)).values
+        response = await self.app.ainvoke(
+            self._input([HumanMessage(content=query)], values), config
+        )
+        await asyncio.to_thread(self._prune, session_id)
+        return response
+
+    async def astream(self, query, session_id="default", stream_mode="updates"):
+        config = self._config(session_id)
+        values = (await self.app.aget_state(config)).values
+        async for chunk in self.app.astream(
+            self._input([HumanMessage(content=query)], values),
+            config,
+            stream_mode=stream_mode,
+        ):
+            yield chunk
+        await asyncio.to_thread(self._prune, session_id)
+
+    async def _analyse(self, query, session_id):
+        # run as the "analyse" node for the callbacks, e.g. `MetricsCollector`
+        config = {
+            **self._config(session_id),
+            "run_name": "analyse",
+            "metadata": {"langgraph_node": "analyse", "thread_id": session_id},
+        }
+        message = HumanMessage(content=query)
+        update = await self._node(self.supervisor).ainvoke(
+            {"messages": [message]}, config
+        )
+        return [message, update["messages"]]
+
+    async def apipeline(self, queries, session_id="default", lookahead=1):
+        """Run consecutive `queries` of a session, analysing ahead.
+
+        The supervisor only reads the query, so the analyses of the next
+        `lookahead` queries run while the juniors and the reviewer of the
+        current one work on the code. These code-dependent stages still run
+        one query after the other. Return the final state of every query.
+        """
+        config = self._config(session_id)
+        analyses, responses = [], []
+        try:
+            for i, query in enumerate(queries):
+                while len(analyses) < min(i + 1 + lookahead, len(queries)):
+                    analyses.append(
+                        asyncio.create_task(
+                            self._analyse(queries[len(analyses)], session_id)
+                        )
+                    )
+                messages = await analyses[i]
+
+                values = (await self.app.aget_state(config)).values
+                state = self._input(messages, values)
+                # resume the graph after the analysis as if it had run it
+                await self.app.aupdate_state(config, state, as_node="analyse")
+                responses.append(await self.app.ainvoke(None, config))
+                await asyncio.to_thread(self._prune, session_id)
+        finally:
+            for task in analyses:
+                task.cancel()
+        return responses
+
+    def pipeline(self, queries, session_id="default", lookahead=1):
+        return run_sync(self.apipeline(queries, session_id, lookahead))
+
+    def delete_session(self, session_id):
+        self.memory.delete_thread(session_id)
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sqlite3
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class LocalSaver(SqliteSaver):
+    """SQLite checkpointer usable from both the sync and the async graph API.
+
+    `SqliteSaver` only implements the synchronous interface; the async
+    methods here run it in a worker thread, which is how `MemorySaver`
+    behaves as well. `prune` bounds the size of the database.
+    """
+
+    def __init__(self, path="checkpoints.sqlite", **kwargs):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(
+            self.put_writes, config, writes, task_id, task_path
+        )
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def prune(self, keep_last=20, thread_id=None):
+        """Delete all but the `keep_last` most recent checkpoints of each thread.
+
+        Checkpoint ids are time ordered, so the most recent checkpoints are the
+        ones with the greatest ids. Pending writes of deleted checkpoints are
+        removed as well.
+        """
+        where, params = "", [keep_last]
+        if thread_id is not None:
+            where, params = "WHERE thread_id = ?", [thread_id, keep_last]
+        with self.cursor() as cur:
+            cur.execute(
+                f"""
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns
+                            ORDER BY checkpoint_id DESC
+                        ) AS rank
+                        FROM checkpoints {where}
+                    )
+                    WHERE rank > ?
+                )
+                """,
+                params,
+            )
+            cur.execute(
+                """
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints
+                    WHERE checkpoints.thread_id = writes.thread_id
+                    AND checkpoints.checkpoint_ns = writes.checkpoint_ns
+                    AND checkpoints.checkpoint_id = writes.checkpoint_id
+                )
+                """
+            )
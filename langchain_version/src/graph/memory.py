@@ -0,0 +1,29 @@
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class LocalMemorySaver(MemorySaver):
+    """In-memory checkpointer whose size can be bounded like `LocalSaver`.
+
+    `prune` drops the old checkpoints of a thread, with their pending writes
+    and the channel values that no remaining checkpoint refers to.
+    """
+
+    def prune(self, keep_last=20, thread_id=None):
+        """Delete all but the `keep_last` most recent checkpoints of each thread."""
+        thread_ids = list(self.storage) if thread_id is None else [thread_id]
+        for thread_id in thread_ids:
+            namespaces = self.storage.get(thread_id, {})
+            used = set()
+            for checkpoint_ns, checkpoints in namespaces.items():
+                # checkpoint ids are time ordered
+                for checkpoint_id in sorted(checkpoints, reverse=True)[keep_last:]:
+                    del checkpoints[checkpoint_id]
+                    self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                for checkpoint, _, _ in checkpoints.values():
+                    versions = self.serde.loads_typed(checkpoint)["channel_versions"]
+                    used.update(
+                        (thread_id, checkpoint_ns, channel, version)
+                        for channel, version in versions.items()
+                    )
+            for key in [k for k in self.blobs if k[0] == thread_id and k not in used]:
+                del self.blobs[key]
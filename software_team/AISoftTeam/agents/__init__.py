@@ -1,7 +1,29 @@
-from .analyst import Analyst
+import importlib
+
+# light, and shadows its own module name: imported eagerly
 from .coordinator import coordinator
-from .coder import Coder
-from .coder_2 import Coder_2
-from .tester import Tester
-from .webscraper import Searcher
-from .mathematician import Mathematician
+
+# the agents are only imported on first access: each one pulls in heavy
+# dependencies (chromadb, pydantic_ai, duckduckgo_search...) that the other
+# ones do not need
+_exports = {
+    "Analyst": ".analyst",
+    "Coder": ".coder",
+    "Coder_2": ".coder_2",
+    "Tester": ".tester",
+    "Searcher": ".webscraper",
+}
+
+__all__ = ["coordinator", *_exports]
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,19 +1,18 @@
+import hashlib
 import os
 from textwrap import dedent
 from typing import List
 from dotenv import load_dotenv
 
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel, OpenAIModelSettings
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
 
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama.embeddings import OllamaEmbeddings
-
 from langchain_ollama.chat_models import ChatOllama
-from langchain_chroma import Chroma
+
+from .utils import count_tokens
+from ..cache import get_response_cache
+from ..cassette import with_cassette
 
 load_dotenv()
 
@@ -146,24 +145,49 @@ Example of response:
 """
 
 
-class Analyst(Agent):
-    def __init__(self, **kwargs):
+def search_documents(websearch):
+    """Return the results of the web searches as documents."""
+    documents = []
+    for results in websearch:
+        for result in results:
+            if not isinstance(result, dict):
+                continue
+            content = "\n".join(
+                r for r in (result.get("title"), result.get("body")) if r
+            )
+            if content:
+                documents.append(
+                    Document(
+                        page_content=content,
+                        metadata={"source": result.get("href", "")},
+                    )
+                )
+    return documents
+
+
+class Analyst:
+    def __init__(
+        self,
+        context_tokens=4096,
+        chunk_size=1000,
+        chunk_overlap=100,
+        crawl_pages=0,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
+        # only the chunks of the web results most relevant to the request, up
+        # to `context_tokens`, are given to the model: the prompt size does
+        # not grow with the number of searches
+        self.context_tokens = context_tokens
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # number of result pages also crawled and indexed
+        self.crawl_pages = crawl_pages
 
         OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
         ANALYST_MODEL = os.getenv("ANALYST_MODEL")
-        ANALYST_EMBED_MODEL = os.getenv("EMBED_MODEL")
-        CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR")
-
-        embeddings = OllamaEmbeddings(
-            model=ANALYST_EMBED_MODEL, base_url=OLLAMA_BASE_URL
-        )
 
-        self.vectorstore = Chroma(
-            persist_directory=CHROMA_PERSIST_DIR,
-            embedding_function=embeddings,
-            collection_name="langgraph-rag",
-        )
+        self._vectorstore = None
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
@@ -176,12 +200,15 @@ class Analyst(Agent):
                 ),
             ]
         )
-        llm = ChatOllama(
-            model=ANALYST_MODEL,
-            temperature=0.2,
-            num_ctx=32768,
-            seed=42,
-            base_url=OLLAMA_BASE_URL,
+        llm = with_cassette(
+            ChatOllama(
+                model=ANALYST_MODEL,
+                temperature=0.2,
+                num_ctx=32768,
+                seed=42,
+                base_url=OLLAMA_BASE_URL,
+                cache=get_response_cache(),
+            )
         )
         self.analyst_llm = self.prompt | llm
 
@@ -202,6 +229,77 @@ class Analyst(Agent):
 
         # self.analyst_llm.instrument_all()
 
+    @property
+    def vectorstore(self):
+        # chromadb is slow to import and to open: only do it when needed
+        if self._vectorstore is None:
+            from langchain_chroma import Chroma
+
+            from ..embeddings import LangChainEmbeddings, get_embedding_service
+
+            self._vectorstore = Chroma(
+                persist_directory=os.getenv("CHROMA_PERSIST_DIR"),
+                embedding_function=LangChainEmbeddings(get_embedding_service()),
+                collection_name="langgraph-rag",
+            )
+        return self._vectorstore
+
+    def _index(self, documents):
+        """Chunk and embed `documents` and return the ids of their chunks.
+
+        The chunks already in the collection are not embedded again.
+        """
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+        )
+        chunks = {}
+        for chunk in splitter.split_documents(documents):
+            key = f"{chunk.metadata.get('source')}\0{chunk.page_content}"
+            chunk.id = hashlib.sha256(key.encode()).hexdigest()
+            chunk.metadata["chunk_id"] = chunk.id
+            chunks[chunk.id] = chunk
+        if not chunks:
+            return []
+
+        known = set(self.vectorstore.get(ids=list(chunks), include=[])["ids"])
+        new = [chunk for id, chunk in chunks.items() if id not in known]
+        if new:
+            self.vectorstore.add_documents(new, ids=[chunk.id for chunk in new])
+        return list(chunks)
+
+    def context(self, question, websearch):
+        """Return the chunks of the web results most relevant to `question`
+        that fit in `context_tokens`."""
+        documents = search_documents(websearch)
+        if self.crawl_pages:
+            from .extractor import extract_content
+
+            urls = [d.metadata["source"] for d in documents if d.metadata["source"]]
+            documents += extract_content(urls[: self.crawl_pages])
+
+        ids = self._index(documents)
+        if not ids:
+            return ""
+        ranked = self.vectorstore.similarity_search(
+            question, k=len(ids), filter={"chunk_id": {"$in": ids}}
+        )
+
+        context, budget = [], self.context_tokens
+        for chunk in ranked:
+            text = f"[{chunk.metadata.get('source', '')}]\n{chunk.page_content}"
+            tokens = count_tokens(text)
+            # a smaller chunk further down may still fit
+            if tokens <= budget:
+                context.append(text)
+                budget -= tokens
+        print(
+            f"context: {len(context)}/{len(ids)} chunks, "
+            f"{self.context_tokens - budget} tokens"
+        )
+        return "\n\n".join(context)
+
     def invoke(self, state, **kwargs):
         """Invoke the agent with the given question and context."""
         # retriever = self.vectorstore.as_retriever()
@@ -228,13 +326,14 @@ class Analyst(Agent):
         # # return self.analyst_llm.invoke({"question": question_with_context})
         # # return self.agent.run_sync(question_with_context, result_type=Steps, **kwargs)
         # # return self.agent.run_sync(question_with_context, **kwargs)
-        question = state["messages"][-1]
+        question = state["messages"][-1].content
         print("**** Analyst ****")
         print("question: ", question)
 
-        print(self.prompt.invoke({"task": question, "context": state["websearch"]}))
+        context = self.context(question, state["websearch"])
+        print(self.prompt.invoke({"task": question, "context": context}))
         response = self.analyst_llm.invoke(
-            {"task": question, "context": state["websearch"]}, **kwargs
+            {"task": question, "context": context}, **kwargs
         )
         # length, _ = extract_code_blocks(response.content)
         # while length == 0 and iteration < 3:
@@ -4,14 +4,9 @@ from typing import List
 from dotenv import load_dotenv
 
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel, OpenAIModelSettings
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
 
-from langchain_community.tools import DuckDuckGoSearchResults
-
-from .utils import extract_code_blocks
+from .utils import build_junior_agent, extract_code_blocks
+from ..cache import run_cached
 
 
 class CodeState(BaseModel):
@@ -46,33 +41,31 @@ Your answer must verify the following bullets:
 
 class Coder:
     def __init__(self):
-        OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
-        CODER_MODEL = os.getenv("CODER_MODEL")
-
-        ollama_model = OpenAIModel(
-            model_name=CODER_MODEL,
-            provider=OpenAIProvider(base_url=OLLAMA_BASE_URL + "/v1/"),
-        )
-
-        self.junior_agent = Agent(
-            model=ollama_model,
-            system_prompt=JUNIOR_PROMPT,
-            model_settings=OpenAIModelSettings(
+        self.base_url = os.getenv("OLLAMA_BASE_URL")
+        self.model = os.getenv("CODER_MODEL")
+        self._junior_agent = None
+
+    @property
+    def junior_agent(self):
+        if self._junior_agent is None:
+            self._junior_agent = build_junior_agent(
+                self.model,
+                self.base_url,
+                JUNIOR_PROMPT,
                 temperature=0.2,
-            ),
-            instrument=True,
-            retries=4,
-            # result_type=CodeState,
-        )
-        self.junior_agent.instrument_all()
+                instrument=True,
+                retries=4,
+            )
+        return self._junior_agent
 
     def invoke(self, state, **kwargs):
         print("**** Coder ****")
 
-        code_info = extract_code_blocks(state["messages"][-1])
+        code_info = extract_code_blocks(state["messages"][-1].content)
         print("code_info: ", code_info)
 
-        response = self.junior_agent.run_sync(
+        response = run_cached(
+            self.junior_agent,
             f"""
 
             Your supervisor ask you to implement a Python code.
@@ -80,6 +73,7 @@ class Coder:
             {code_info[1]}
 
             """,
+            JUNIOR_PROMPT,
             **kwargs,
         )
         print("response: ", response)
@@ -1,8 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List
-import xml.etree.ElementTree as ET
 
-from .utils import extract_code_blocks
+from .utils import parse_tags
 
 
 class Step(BaseModel):
@@ -27,21 +26,21 @@ class Steps(BaseModel):
 
 
 def coordinator(state):
-    _, code_blocks = extract_code_blocks(state["messages"][-1].content)
-    root = ET.fromstring(code_blocks)
-
-    request = root[0].text
-    web_search = []
-    steps = []
-    for elem in root.iter():
-        if elem.tag == "step":
-            steps.append(elem.text)
-        if elem.tag == "web_search":
-            for child in elem:
-                web_search.append(child.text)
+    # the analyst answer is parsed in one pass, even when it is malformed or
+    # truncated
+    root = parse_tags(state["messages"][-1].content)
+    request = next(root.find_all("request"), None)
+    web_search = [
+        child.text for elem in root.find_all("web_search") for child in elem.children
+    ]
+    steps = [elem.text for elem in root.find_all("step")]
 
     return {
-        "steps": Steps(request=request, web_search=web_search, steps=steps),
+        "steps": Steps(
+            request=request.text if request is not None else "",
+            web_search=web_search,
+            steps=steps,
+        ),
         "current_code": "",
         "current_step": -1,
     }
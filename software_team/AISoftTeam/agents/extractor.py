@@ -1,20 +1,452 @@
-from langchain_community.document_loaders import RecursiveUrlLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from bs4 import BeautifulSoup as Soup
-import markdownify
+import html
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urlsplit
+
+import httpx
+import lxml.html
+from langchain_core.documents import Document
+from langchain_core.utils.html import extract_sub_links
+
+TITLE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+LANGUAGE = re.compile(r"<html[^>]*\slang=[\"']?([\w-]+)", re.IGNORECASE)
 
 
 def bs4_extractor(html: str) -> str:
+    from bs4 import BeautifulSoup as Soup
+    import markdownify
+
     soup = Soup(html, "html.parser")
     for script in soup(["script", "style", "nav"]):
         script.decompose()
     return markdownify.markdownify(str(soup), heading_style="ATX")
 
 
+# elements that are not part of the content of a page
+BOILERPLATE = {
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+    "form",
+    "button",
+    "iframe",
+    "svg",
+    "canvas",
+}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "search"}
+BLOCKS = {
+    "address",
+    "article",
+    "dd",
+    "details",
+    "div",
+    "dl",
+    "dt",
+    "figcaption",
+    "figure",
+    "main",
+    "p",
+    "section",
+    "summary",
+}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+CODE_LANGUAGE = re.compile(r"(?:language|lang|highlight)-([\w+#.-]+)")
+SPACES = re.compile(r"\s+")
+BLANK_LINES = re.compile(r"\n\s*\n\s*\n+")
+
+
+class _Markdown:
+    """Markdown writer used by `lxml_extractor`, in one walk of the tree."""
+
+    def __init__(self):
+        self.out = []
+
+    def text(self, text):
+        text = SPACES.sub(" ", text)
+        if not self.out or self.out[-1].endswith("\n"):
+            text = text.lstrip()
+        if text:
+            self.out.append(text)
+
+    def block(self):
+        if self.out and not self.out[-1].endswith("\n\n"):
+            self.out.append("\n\n")
+
+    def inline(self, element):
+        """The markdown of `element` on a single line."""
+        writer = _Markdown()
+        writer.children(element)
+        return SPACES.sub(" ", "".join(writer.out)).strip()
+
+    def children(self, element):
+        if element.text:
+            self.text(element.text)
+        for child in element:
+            self.element(child)
+            if child.tail:
+                self.text(child.tail)
+
+    def element(self, element):
+        tag = element.tag
+        if not isinstance(tag, str):
+            # comments and processing instructions
+            return
+        tag = tag.lower()
+        if tag in BOILERPLATE or element.get("role") in BOILERPLATE_ROLES:
+            return
+        if tag == "a" and "headerlink" in element.get("class", ""):
+            # permalink "¶" of the Sphinx headings
+            return
+
+        if tag in HEADINGS:
+            self.block()
+            self.out.append("#" * HEADINGS[tag] + " " + self.inline(element))
+            self.block()
+        elif tag == "pre":
+            self.block()
+            self.out.append(f"```{self.code_language(element)}\n")
+            self.out.append(element.text_content().strip("\n") + "\n```")
+            self.block()
+        elif tag in ("ul", "ol"):
+            self.list_items(element, ordered=tag == "ol")
+        elif tag == "table":
+            self.table(element)
+        elif tag == "blockquote":
+            self.block()
+            self.out.append(self.indent(self.render(element), "> ", "> "))
+            self.block()
+        elif tag == "br":
+            self.out.append("\n")
+        elif tag == "hr":
+            self.block()
+            self.out.append("---")
+            self.block()
+        elif tag == "code":
+            text = element.text_content()
+            if text.strip():
+                self.out.append(f"`{text}`")
+        elif tag == "a":
+            text = self.inline(element)
+            href = element.get("href")
+            if href and text and not href.startswith(("#", "javascript:")):
+                self.out.append(f"[{text}]({href})")
+            elif text:
+                self.text(text)
+        elif tag in ("strong", "b"):
+            self.emphasis(element, "**")
+        elif tag in ("em", "i"):
+            self.emphasis(element, "*")
+        elif tag == "img":
+            alt = element.get("alt")
+            if alt:
+                self.out.append(f"![{alt}]({element.get('src', '')})")
+        elif tag in BLOCKS:
+            self.block()
+            self.children(element)
+            self.block()
+        else:
+            self.children(element)
+
+    def emphasis(self, element, marker):
+        text = self.inline(element)
+        if text:
+            self.out.append(f"{marker}{text}{marker}")
+
+    @staticmethod
+    def code_language(element):
+        # the language is on the <pre>, its <code> or a wrapping <div>
+        # (Sphinx, GitHub...)
+        candidates = [element, *element.iterchildren("code")]
+        candidates += list(element.iterancestors())[:2]
+        for candidate in candidates:
+            match = CODE_LANGUAGE.search(candidate.get("class", ""))
+            if match:
+                return match.group(1)
+        return ""
+
+    @staticmethod
+    def render(element):
+        writer = _Markdown()
+        writer.children(element)
+        return BLANK_LINES.sub("\n\n", "".join(writer.out)).strip()
+
+    @staticmethod
+    def indent(text, first, other):
+        lines = text.splitlines() or [""]
+        return "\n".join(
+            [first + lines[0]]
+            + [other + line if line else other.rstrip() for line in lines[1:]]
+        )
+
+    def list_items(self, element, ordered):
+        self.block()
+        items = []
+        for i, item in enumerate(element.iterchildren("li"), 1):
+            marker = f"{i}. " if ordered else "- "
+            items.append(self.indent(self.render(item), marker, " " * len(marker)))
+        self.out.append("\n".join(items))
+        self.block()
+
+    def table(self, element):
+        rows = []
+        for row in element.iter("tr"):
+            cells = [
+                self.inline(cell).replace("|", "\\|")
+                for cell in row
+                if isinstance(cell.tag, str) and cell.tag in ("th", "td")
+            ]
+            if cells:
+                rows.append("| " + " | ".join(cells) + " |")
+        if not rows:
+            return
+        width = rows[0].count(" | ") + 1
+        rows.insert(1, "|" + " --- |" * width)
+        self.block()
+        self.out.append("\n".join(rows))
+        self.block()
+
+
+def lxml_extractor(html: str) -> str:
+    """Convert a web page to markdown in a single pass over its lxml tree.
+
+    Scripts, styles, navigation, headers, footers and the like are dropped;
+    code blocks are kept verbatim in fenced blocks with their language.
+    """
+    if not html.strip():
+        return ""
+    # a str with an XML encoding declaration is refused by lxml
+    parser = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True)
+    root = lxml.html.document_fromstring(html.encode("utf-8"), parser=parser)
+    body = root.find("body")
+    return _Markdown.render(body if body is not None else root)
+
+
+class HttpCache:
+    """On-disk SQLite cache of the pages fetched by the `Crawler`.
+
+    Pages are stored with their `ETag` and `Last-Modified` validators, which
+    are sent back on the next fetch: an unchanged page is answered with a
+    bodyless 304 and read from the cache. Pages without validators are not
+    stored.
+    """
+
+    def __init__(self, path="http_cache.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    body TEXT NOT NULL,
+                    fetched REAL NOT NULL
+                )
+                """
+            )
+
+    def __repr__(self):
+        return f"HttpCache({self.path!r})"
+
+    def lookup(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_type, body FROM pages"
+                " WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified", "content_type", "body"), row))
+
+    def update(self, url, response):
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if etag is None and last_modified is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    etag,
+                    last_modified,
+                    response.headers.get("content-type", ""),
+                    response.text,
+                    time.time(),
+                ),
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+
+
+class Crawler:
+    """Concurrent crawler turning web pages into markdown documents.
+
+    All the fetches share one HTTP connection pool, with at most `per_host`
+    requests in flight to the same host. From each start URL, the links
+    under it are followed up to `max_depth` pages deep (1: only the start
+    page), and a crawl fetches at most `max_pages` pages. With a `cache`,
+    pages are revalidated with conditional GETs instead of downloaded again.
+    """
+
+    def __init__(
+        self,
+        max_depth=1,
+        max_pages=100,
+        max_connections=16,
+        per_host=4,
+        timeout=10.0,
+        cache=None,
+        extractor=lxml_extractor,
+    ):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.cache = cache
+        self.extractor = extractor
+        self.client = httpx.Client(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def __repr__(self):
+        return f"Crawler(max_depth={self.max_depth}, max_pages={self.max_pages})"
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.per_host)
+            return self._hosts[host]
+
+    def fetch(self, url):
+        """Return the body and the content type of `url`."""
+        cached = self.cache.lookup(url) if self.cache is not None else None
+        headers = {}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        with self._host_limit(url):
+            response = self.client.get(url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            return cached["body"], cached["content_type"]
+        response.raise_for_status()
+        if self.cache is not None:
+            self.cache.update(url, response)
+        return response.text, response.headers.get("content-type", "")
+
+    def _load(self, url, root):
+        body, content_type = self.fetch(url)
+        if "html" not in content_type and "text" not in content_type:
+            return None, []
+        metadata = {"source": url, "content_type": content_type}
+        title = TITLE.search(body)
+        if title:
+            metadata["title"] = html.unescape(title.group(1)).strip()
+        language = LANGUAGE.search(body)
+        if language:
+            metadata["language"] = language.group(1)
+        links = extract_sub_links(body, url, base_url=root, continue_on_failure=True)
+        document = Document(page_content=self.extractor(body), metadata=metadata)
+        return document, links
+
+    def crawl(self, urls, max_depth=None, max_pages=None):
+        """Yield the documents of the pages as soon as they are fetched.
+
+        Pages that cannot be fetched are skipped.
+        """
+        max_depth = self.max_depth if max_depth is None else max_depth
+        max_pages = self.max_pages if max_pages is None else max_pages
+        seen = set()
+        pending = {}
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_connections, thread_name_prefix="crawl"
+        )
+
+        def submit(url, root, depth):
+            url = urldefrag(url).url
+            if url in seen or len(seen) >= max_pages or depth >= max_depth:
+                return
+            seen.add(url)
+            future = executor.submit(self._load, url, root)
+            pending[future] = (url, root, depth)
+
+        try:
+            for url in urls:
+                submit(url, url, 0)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, root, depth = pending.pop(future)
+                    try:
+                        document, links = future.result()
+                    except Exception as e:
+                        print(f"crawl failed: {url}: {e!r}")
+                        continue
+                    for link in links:
+                        submit(link, root, depth + 1)
+                    if document is not None:
+                        yield document
+        finally:
+            # the pages not fetched yet are dropped when the caller stops early
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.client.close()
+
+
+_crawler = None
+
+
+def get_crawler():
+    """Return the shared crawler.
+
+    Its HTTP cache is enabled by setting `CRAWL_CACHE_PATH`;
+    `CRAWL_MAX_PAGES` and `CRAWL_PER_HOST` set its budget and per host
+    concurrency.
+    """
+    global _crawler
+
+    path = os.getenv("CRAWL_CACHE_PATH")
+    if _crawler is None or getattr(_crawler.cache, "path", None) != path:
+        max_pages = os.getenv("CRAWL_MAX_PAGES")
+        per_host = os.getenv("CRAWL_PER_HOST")
+        _crawler = Crawler(
+            max_pages=int(max_pages) if max_pages else 100,
+            per_host=int(per_host) if per_host else 4,
+            cache=HttpCache(path) if path else None,
+        )
+    return _crawler
+
+
 def extract_content(urls, max_depth=1):
-    docs = [
-        RecursiveUrlLoader(url, extractor=bs4_extractor, max_depth=max_depth).load()
-        for url in urls
-    ]
-    docs_list = [item for sublist in docs for item in sublist]
-    return docs_list
+    return list(get_crawler().crawl(urls, max_depth=max_depth))
@@ -1,6 +1,6 @@
+import hashlib
+import json
 import os
-import tempfile
-import shutil
 from pathlib import Path
 from git import Repo
 from llama_index.core import (
@@ -10,7 +10,6 @@ from llama_index.core import (
 )
 from llama_index.core import Settings
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.readers.file import FlatReader
 from llama_index.core.node_parser import SentenceSplitter
 from llama_index.core.retrievers import VectorIndexRetriever
@@ -18,19 +17,23 @@ from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.postprocessor import SimilarityPostprocessor
 import concurrent.futures
 
+from ..embeddings import get_embedding_service, llama_index_embedding
+
 
 OLLAMA_BASE_URL = "http://localhost:8888"
 
 
 class GitHubRAG:
-    def __init__(self, persist_dir="github_rag_storage"):
+    def __init__(self, persist_dir="github_rag_storage", max_files=41):
         """
         Initialize the RAG system for GitHub repositories
 
         Args:
             persist_dir (str): Directory to save the index
+            max_files (int): Maximum number of files indexed per repository
         """
         self.persist_dir = persist_dir
+        self.max_files = max_files
         self.exclusions = [
             "node_modules",
             ".git",
@@ -62,39 +65,70 @@ class GitHubRAG:
             ".html",
             ".css",
         ]
-        self.processed_repos = []
+        # for each repository: its branch, the last indexed commit and, for
+        # each indexed file, its content hash and the ids of its documents
+        self.meta_path = os.path.join(persist_dir, "index_meta.json")
+        self.meta = {}
+        # ids of the indexed documents missing from the metadata, by
+        # repository: they are replaced when their repository is processed
+        self.legacy_docs = {}
 
         # Initialize LlamaIndex contexts
         llm = Ollama(
             model="deepseek-r1:7b", base_url=OLLAMA_BASE_URL, request_timeout=300.0
         )
-        embed_model = OllamaEmbedding(
-            model_name="mxbai-embed-large:latest",
-            base_url=OLLAMA_BASE_URL,
-            request_timeout=300.0,
+        # batched, and cached by content: re-indexing unchanged files costs
+        # no embedding call
+        embed_model = llama_index_embedding(
+            get_embedding_service("mxbai-embed-large:latest", OLLAMA_BASE_URL)
         )
         Settings.llm = llm
         Settings.embed_model = embed_model
         Settings.node_parser = SentenceSplitter(chunk_size=1024, chunk_overlap=200)
 
         # Load existing index if available
-        if os.path.exists(persist_dir):
+        self.index = None
+        os.makedirs(persist_dir, exist_ok=True)
+        if os.path.exists(os.path.join(persist_dir, "docstore.json")):
             try:
                 storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
                 self.index = load_index_from_storage(storage_context)
                 print(f"Index loaded from {persist_dir}")
 
-                # Load the list of processed repositories
-                repo_list_path = os.path.join(persist_dir, "processed_repos.txt")
-                if os.path.exists(repo_list_path):
-                    with open(repo_list_path, "r") as f:
-                        self.processed_repos = [line.strip() for line in f.readlines()]
+                if os.path.exists(self.meta_path):
+                    with open(self.meta_path, "r") as f:
+                        self.meta = json.load(f)
+                self.legacy_docs = self._legacy_docs()
             except Exception as e:
                 print(f"Error loading index: {e}")
                 self.index = None
-        else:
-            self.index = None
-            os.makedirs(persist_dir, exist_ok=True)
+
+    @property
+    def processed_repos(self):
+        return list(self.meta)
+
+    def _legacy_docs(self):
+        """
+        Find the documents of the index that the metadata does not know
+
+        Indexes written before `index_meta.json` (with `processed_repos.txt`)
+        have documents with random ids, which would stay next to the new ones.
+
+        Returns:
+            dict: Ids of these documents for each repository URL
+        """
+        known = {
+            doc_id
+            for meta in self.meta.values()
+            for file in meta["files"].values()
+            for doc_id in file["docs"]
+        }
+        docs = {}
+        for doc_id, info in self.index.ref_doc_info.items():
+            repo_url = info.metadata.get("repo_url")
+            if repo_url is not None and doc_id not in known:
+                docs.setdefault(repo_url, []).append(doc_id)
+        return docs
 
     def _is_valid_file(self, filepath):
         """
@@ -118,116 +152,253 @@ class GitHubRAG:
 
         return True
 
-    def process_repository(self, repo_url, branch="main"):
+    def _checkout(self, repo_url, branch=None):
         """
-        Process a GitHub repository
+        Update the local copy of a repository and return its path
+
+        The copies are kept in `persist_dir`/repos. They are partial clones
+        with a sparse checkout: only the last commit of `branch` and the blobs
+        of the files with one of `self.extensions`, outside of
+        `self.exclusions`, are downloaded. An existing copy is updated with a
+        fetch instead of a new clone.
 
         Args:
             repo_url (str): GitHub repository URL
-            branch (str): Branch to use
+            branch (str): Branch to use, the default branch if None
+
+        Returns:
+            str: Path of the working tree
+        """
+        name = os.path.basename(repo_url.rstrip("/")).removesuffix(".git")
+        path = os.path.join(
+            self.persist_dir,
+            "repos",
+            f"{name}-{hashlib.sha256(repo_url.encode()).hexdigest()[:8]}",
+        )
+        if os.path.exists(os.path.join(path, ".git")):
+            print(f"Fetching repository {repo_url}...")
+            repo = Repo(path)
+            repo.git.fetch(
+                "--depth=1", "--filter=blob:none", "origin", branch or "HEAD"
+            )
+            repo.git.reset("--hard", "FETCH_HEAD")
+            return path
+
+        print(f"Cloning repository {repo_url}...")
+        options = {"branch": branch} if branch else {}
+        repo = Repo.clone_from(
+            repo_url,
+            path,
+            depth=1,
+            filter="blob:none",
+            no_checkout=True,
+            single_branch=True,
+            **options,
+        )
+        repo.git.sparse_checkout(
+            "set",
+            "--no-cone",
+            *(f"*{ext}" for ext in self.extensions),
+            *(f"!**/{exclusion}/**" for exclusion in self.exclusions),
+        )
+        repo.git.checkout(branch or repo.active_branch.name)
+        return path
+
+    def _changed_files(self, repo_dir, old_commit, new_commit):
+        """
+        List the files changed between two commits
+
+        Args:
+            repo_dir (str): Path of the working tree
+            old_commit (str): Last indexed commit
+            new_commit (str): Current commit
+
+        Returns:
+            set: Paths of the added, modified and deleted files, or None if
+            the old commit is not known anymore
+        """
+        try:
+            output = Repo(repo_dir).git.diff(
+                "--name-status", "--no-renames", old_commit, new_commit
+            )
+        except Exception as e:
+            print(f"Cannot diff {old_commit[:8]}..{new_commit[:8]}: {e}")
+            return None
+        return {line.split("\t", 1)[1] for line in output.splitlines() if line}
+
+    def _tracked_files(self, repo_dir):
+        """
+        List the files of the working tree to index
+
+        Args:
+            repo_dir (str): Path of the working tree
 
         Returns:
-            list: Processed documents
+            set: Paths of the files relative to `repo_dir`
+        """
+        files = set()
+        for root, dirs, filenames in os.walk(repo_dir):
+            # Ignore excluded directories
+            dirs[:] = [d for d in dirs if d not in self.exclusions]
+            for filename in filenames:
+                filepath = os.path.join(root, filename)
+                if self._is_valid_file(filepath):
+                    files.add(os.path.relpath(filepath, repo_dir))
+        return files
+
+    def process_repository(self, repo_url, branch=None):
         """
-        # Check if repository has already been processed
-        if repo_url in self.processed_repos:
-            print(f"Repository {repo_url} already processed")
-            return []
+        Process a GitHub repository
 
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp()
+        Only the files changed since the last indexed commit (`git diff`),
+        whose content hash changed, are loaded again. The documents of the
+        repository indexed without metadata, or from another branch, are
+        deleted.
+
+        Args:
+            repo_url (str): GitHub repository URL
+            branch (str): Branch to use, the default branch if None. It used
+                to default to "main", which was never passed to the clone:
+                the default branch was always indexed.
+
+        Returns:
+            tuple: Documents to insert, ids of the documents to delete and
+            new metadata of the repository
+        """
         try:
-            print(f"Cloning repository {repo_url}...")
-            Repo.clone_from(repo_url, temp_dir)  # , branch=branch)
+            repo_dir = self._checkout(repo_url, branch)
+            commit = Repo(repo_dir).head.commit.hexsha
+
+            meta = self.meta.get(repo_url)
+            deleted = list(self.legacy_docs.get(repo_url, []))
+            if meta is not None and meta["branch"] != branch:
+                # another branch: nothing in common with the indexed one
+                deleted.extend(
+                    doc_id for file in meta["files"].values() for doc_id in file["docs"]
+                )
+                meta = None
+            if meta is not None and meta["commit"] == commit:
+                print(f"Repository {repo_url} is up to date")
+                return [], deleted, meta
+
+            files = dict(meta["files"]) if meta is not None else {}
+            changed = None
+            if meta is not None:
+                changed = self._changed_files(repo_dir, meta["commit"], commit)
+            if changed is None:
+                changed = self._tracked_files(repo_dir) | set(files)
 
             # Load files with FlatReader
             reader = FlatReader()
             all_documents = []
 
-            nfiles = 0
-            for root, dirs, files in os.walk(temp_dir):
-
-                # Ignore excluded directories
-                dirs[:] = [d for d in dirs if d not in self.exclusions]
-
-                for file in files:
-                    if nfiles > 40:
-                        break
-                    filepath = os.path.join(root, file)
-                    if self._is_valid_file(filepath):
-                        try:
-                            print(f"Loading {filepath}")
-                            documents = reader.load_data(Path(filepath))
-                            print("Documents: ", documents)
-                            for doc in documents:
-                                # Add metadata
-                                doc.metadata["repo_url"] = repo_url
-                                doc.metadata["filepath"] = os.path.relpath(
-                                    filepath, temp_dir
-                                )
-                            all_documents.extend(documents)
-                            nfiles += 1
-                        except Exception as e:
-                            print(f"Error loading {filepath}: {e}")
-
-            print(f"Number of documents loaded from {repo_url}: {len(all_documents)}")
-
-            # Mark repository as processed
-            self.processed_repos.append(repo_url)
-            with open(os.path.join(self.persist_dir, "processed_repos.txt"), "w") as f:
-                for repo in self.processed_repos:
-                    f.write(f"{repo}\n")
-
-            return all_documents
+            for relpath in sorted(changed):
+                filepath = os.path.join(repo_dir, relpath)
+                exists = os.path.isfile(filepath) and self._is_valid_file(filepath)
+                if exists:
+                    with open(filepath, "rb") as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                    if relpath in files and files[relpath]["hash"] == digest:
+                        continue
+                if relpath in files:
+                    deleted.extend(files.pop(relpath)["docs"])
+                if not exists or len(files) >= self.max_files:
+                    continue
+                try:
+                    print(f"Loading {filepath}")
+                    documents = reader.load_data(Path(filepath))
+                    for i, doc in enumerate(documents):
+                        # stable ids: the documents of a file can be deleted
+                        # when it changes
+                        doc.id_ = f"{repo_url}::{relpath}"
+                        if i:
+                            doc.id_ += f"::{i}"
+                        # Add metadata
+                        doc.metadata["repo_url"] = repo_url
+                        doc.metadata["filepath"] = relpath
+                    files[relpath] = {
+                        "hash": digest,
+                        "docs": [doc.id_ for doc in documents],
+                    }
+                    all_documents.extend(documents)
+                except Exception as e:
+                    print(f"Error loading {filepath}: {e}")
+
+            print(
+                f"{repo_url}: {len(all_documents)} documents to add, "
+                f"{len(deleted)} to delete"
+            )
+            return (
+                all_documents,
+                deleted,
+                {"branch": branch, "commit": commit, "files": files},
+            )
 
         except Exception as e:
             print(f"Error processing {repo_url}: {e}")
-            return []
-        finally:
-            # Clean up temporary directory
-            shutil.rmtree(temp_dir)
-            pass
+            return [], [], self.meta.get(repo_url)
 
-    def add_repositories(self, repo_urls, max_workers=2):
+    def add_repositories(self, repo_urls, max_workers=2, branch=None):
         """
-        Add multiple repositories to the index
+        Add multiple repositories to the index, or update them
 
         Args:
             repo_urls (list): List of repository URLs
             max_workers (int): Number of parallel workers
+            branch (str): Branch to use, the default branch of each
+                repository if None
         """
         all_documents = []
+        deleted = []
+        meta = {}
 
         # Parallel processing of repositories
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = {
-                executor.submit(self.process_repository, url): url for url in repo_urls
+                executor.submit(self.process_repository, url, branch): url
+                for url in repo_urls
             }
             for future in concurrent.futures.as_completed(futures):
                 url = futures[future]
                 try:
-                    documents = future.result()
+                    documents, deleted_ids, meta[url] = future.result()
                     all_documents.extend(documents)
+                    deleted.extend(deleted_ids)
                     print(f"Processing of {url} completed")
                 except Exception as e:
                     print(f"Error processing {url}: {e}")
 
-        if not all_documents:
+        if all_documents or deleted:
+            # Create or update the index
+            if self.index is None:
+                # Create a new index
+                self.index = VectorStoreIndex.from_documents(all_documents)
+            else:
+                # Remove the documents of the deleted and modified files
+                for doc_id in deleted:
+                    self.index.delete_ref_doc(doc_id, delete_from_docstore=True)
+                # Add to existing index
+                for doc in all_documents:
+                    self.index.insert(doc)
+            self.index.storage_context.persist(persist_dir=self.persist_dir)
+            print(f"Index saved to {self.persist_dir}")
+        else:
             print("No new documents to add")
-            return
-
-        # Create or update the index
         if self.index is None:
-            # Create a new index
-            self.index = VectorStoreIndex.from_documents(all_documents)
-        else:
-            # Add to existing index
-            for doc in all_documents:
-                self.index.insert(doc)
+            return
 
-        # Persist the index
-        self.index.storage_context.persist(persist_dir=self.persist_dir)
-        print(f"Index saved to {self.persist_dir}")
+        # the metadata is only saved once the index it describes is
+        meta = {url: m for url, m in meta.items() if m is not None}
+        self.meta.update(meta)
+        for url in meta:
+            self.legacy_docs.pop(url, None)
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f, indent=1)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+        # replaced by the metadata
+        legacy_list = os.path.join(self.persist_dir, "processed_repos.txt")
+        if os.path.exists(legacy_list):
+            os.remove(legacy_list)
 
     def query(self, question, top_k=5):
         """
@@ -4,9 +4,9 @@ from typing import List
 from dotenv import load_dotenv
 
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel, OpenAIModelSettings
-from pydantic_ai.providers.openai import OpenAIProvider
+
+from .utils import build_junior_agent
+from ..cache import run_cached
 
 
 class CodeState(BaseModel):
@@ -26,27 +26,22 @@ You write tests using pytest to ensure that if there are any errors or bugs, you
 
 class Tester:
     def __init__(self):
-        OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
-        TESTER_MODEL = os.getenv("TESTER_MODEL")
-
-        ollama_model = OpenAIModel(
-            model_name=TESTER_MODEL,
-            provider=OpenAIProvider(base_url=OLLAMA_BASE_URL + "/v1/"),
-        )
-
-        self.junior_agent = Agent(
-            model=ollama_model,
-            system_prompt=TESTER_PROMPT,
-            model_settings=OpenAIModelSettings(
-                temperature=0.0,
-            ),
-            # retries=4,
-            # result_type=CodeState,
-        )
+        self.base_url = os.getenv("OLLAMA_BASE_URL")
+        self.model = os.getenv("TESTER_MODEL")
+        self._junior_agent = None
+
+    @property
+    def junior_agent(self):
+        if self._junior_agent is None:
+            self._junior_agent = build_junior_agent(
+                self.model, self.base_url, TESTER_PROMPT
+            )
+        return self._junior_agent
 
     def invoke(self, state, **kwargs):
         print("**** Tester ****")
-        response = self.junior_agent.run_sync(
+        response = run_cached(
+            self.junior_agent,
             f"""
 
             The code you have to test is: {state["current_code"]}
@@ -54,6 +49,7 @@ class Tester:
             Add in the same file the tests for the code.
 
             """,
+            TESTER_PROMPT,
             **kwargs,
         )
         print("response: ", response)
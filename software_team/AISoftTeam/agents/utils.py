@@ -1,6 +1,12 @@
+import html
 import re
 
 
+def count_tokens(text):
+    """Rough token count of a text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
 def extract_code_blocks(markdown_text):
     """
     Extract code blocks from markdown text.
@@ -11,3 +17,158 @@ def extract_code_blocks(markdown_text):
     # Find all matches with re.DOTALL to match across multiple lines
     matches = re.findall(pattern, markdown_text, re.DOTALL)
     return len(matches), "<root>\n" + "".join(matches) + "</root>\n"
+
+
+TAG = re.compile(r"<(/?)([A-Za-z_][\w.-]*)((?:\s+[^<>]*?)?)\s*(/?)>")
+ATTRIBUTE = re.compile(r"""([\w.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+# a "<" followed by this many characters without ">" is not a tag
+MAX_TAG_LENGTH = 256
+
+
+class Element:
+    """Element found by `TagParser`."""
+
+    def __init__(self, tag, attrib=None):
+        self.tag = tag
+        self.attrib = attrib or {}
+        self.children = []
+        self._text = []
+
+    def __repr__(self):
+        return f"Element({self.tag!r}, {self.attrib!r}, text={self.text!r})"
+
+    @property
+    def text(self):
+        """The text inside the element, including the one of its children."""
+        return html.unescape("".join(self._text)).strip()
+
+    def find_all(self, tag):
+        for child in self.children:
+            if child.tag == tag:
+                yield child
+            yield from child.find_all(tag)
+
+
+class TagParser:
+    """Tolerant incremental parser for the XML-like answers of the models.
+
+    Text is given in arbitrary chunks to `feed`, which returns the elements
+    closed by this chunk, so that they can be used before the end of the
+    answer. Everything outside the tags (markdown fences, explanations...) is
+    ignored, unknown closing tags are skipped, a closing tag implicitly closes
+    the elements left open inside it, so does a new element with the same tag,
+    and `close` closes the ones still open at the end of a truncated answer.
+    When `tags` is given, only these tags are parsed and any other one is kept
+    as text.
+    """
+
+    def __init__(self, tags=None):
+        self.tags = set(tags) if tags is not None else None
+        self.root = Element(None)
+        self._stack = [self.root]
+        self._buffer = ""
+
+    def _text(self, text):
+        for element in self._stack[1:]:
+            element._text.append(text)
+
+    def _open(self, tag, attributes):
+        attrib = {}
+        for name, *values in ATTRIBUTE.findall(attributes):
+            attrib[name] = next((value for value in values if value), "")
+        element = Element(tag, attrib)
+        self._stack[-1].children.append(element)
+        self._stack.append(element)
+        return element
+
+    def _close(self, tag):
+        if tag not in (element.tag for element in self._stack[1:]):
+            return []
+        closed = []
+        while True:
+            element = self._stack.pop()
+            closed.append(element)
+            if element.tag == tag:
+                return closed
+
+    def feed(self, text):
+        """Parse the next chunk of text and return the elements it closed."""
+        self._buffer += text
+        closed = []
+        while True:
+            start = self._buffer.find("<")
+            if start == -1:
+                self._text(self._buffer)
+                self._buffer = ""
+                return closed
+            self._text(self._buffer[:start])
+            self._buffer = self._buffer[start:]
+
+            match = TAG.match(self._buffer)
+            if match is None:
+                end = self._buffer.find(">")
+                if end == -1 and len(self._buffer) < MAX_TAG_LENGTH:
+                    # maybe a tag split between two chunks
+                    return closed
+                self._text("<")
+                self._buffer = self._buffer[1:]
+                continue
+
+            self._buffer = self._buffer[match.end() :]
+            closing, tag, attributes, empty = match.groups()
+            if self.tags is not None and tag not in self.tags:
+                self._text(match.group(0))
+            elif closing:
+                closed.extend(self._close(tag))
+            else:
+                if self._stack[-1].tag == tag:
+                    # an element never contains itself: the previous one was
+                    # not closed
+                    closed.extend(self._close(tag))
+                element = self._open(tag, attributes)
+                if empty:
+                    closed.extend(self._close(element.tag))
+
+    def close(self):
+        """Flush the text left and return the elements that were never closed."""
+        self._text(self._buffer)
+        self._buffer = ""
+        closed = self._stack[:0:-1]
+        del self._stack[1:]
+        return closed
+
+
+def parse_tags(text, tags=None):
+    """Return the root of the elements found in `text` by a `TagParser`."""
+    parser = TagParser(tags)
+    parser.feed(text)
+    parser.close()
+    return parser.root
+
+
+def build_junior_agent(model, base_url, system_prompt, temperature=0.0, **kwargs):
+    """Return a pydantic_ai agent running `model` on the Ollama server at
+    `base_url`, through its OpenAI compatible API.
+
+    The other keyword arguments are passed to `Agent`; the agent is
+    instrumented when `instrument` is true.
+    """
+    # pydantic_ai and the OpenAI client are slow to import: they are only
+    # imported when an agent is built, for its first run
+    from pydantic_ai import Agent
+    from pydantic_ai.models.openai import OpenAIModel, OpenAIModelSettings
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    ollama_model = OpenAIModel(
+        model_name=model,
+        provider=OpenAIProvider(base_url=base_url + "/v1/"),
+    )
+    agent = Agent(
+        model=ollama_model,
+        system_prompt=system_prompt,
+        model_settings=OpenAIModelSettings(temperature=temperature),
+        **kwargs,
+    )
+    if kwargs.get("instrument"):
+        agent.instrument_all()
+    return agent
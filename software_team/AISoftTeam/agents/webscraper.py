@@ -1,15 +1,20 @@
+import json
 import os
+import re
+from typing import List
 from dotenv import load_dotenv
 
+from pydantic import BaseModel, Field, ValidationError
+from langchain_core.load import dumps
+from langchain_core.messages import message_chunk_to_message
+from langchain_core.outputs import ChatGeneration
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_ollama.chat_models import ChatOllama
-from langchain_community.tools import DuckDuckGoSearchResults
-from duckduckgo_search import DDGS
 
-import xml.etree.ElementTree as ET
-
-from .utils import extract_code_blocks
-from .extractor import extract_content
+from .utils import TagParser, parse_tags
+from ..cache import get_response_cache
+from ..cassette import with_cassette
+from ..search import SearchExecutor, get_search_backend
 
 load_dotenv()
 
@@ -20,81 +25,106 @@ PROMPT = """You are a smart assistant bot that helps answer questions from the u
 - You don't try to answer the question.
 - You just identify the web search to be done.
 - Add the research of the mathematical formula of the studies.
-- For each <web_search>, you will write a list of keywords to search on the web to find information to help to answer the question.
-- You pay attention that each <web_search> is about a different topic.
-- You use the following structure to answer the question:
-
-```xml
-<root>
-    <web_search id="1">
-        List of keywords to search on the web to find information to help to answer the question
-    </web_search>
-    <web_search id="2">
-        List of keywords to search on the web to find information to help to answer the question
-    </web_search>
-    <web_search id="3">
-        List of keywords to search on the web to find information to help to answer the question
-    </web_search>
-    <web_search id="4">
-        List of keywords to search on the web to find information to help to answer the question
-    </web_search>
-    <web_search id="5">
-        List of keywords to search on the web to find information to help to answer the question
-    </web_search>
-</root>
-```
+- For each web search, you will write a query: a list of keywords to search on the web to find information to help to answer the question.
+- You pay attention that each web search is about a different topic.
+- You answer with a JSON object with the following structure:
+
+{{
+    "web_search": [
+        {{"query": "keywords of the first topic"}},
+        {{"query": "keywords of the second topic"}},
+        {{"query": "keywords of the third topic"}},
+        {{"query": "keywords of the fourth topic"}},
+        {{"query": "keywords of the fifth topic"}}
+    ]
+}}
 
 - You have to use this structure to your response and nothing else.
-- There is just keywords in each <websearch> tag, no codes, no explanations.
+- There is just keywords in each query, no codes, no explanations.
 
 """
 
-PROMPT_2 = """You are a smart assistant bot that helps answer questions from the user.
 
-- You identify a list of web search to be done according to the several topics of the question to find information to help to answer the question and nothing else.
-- You don't try to answer the question.
-- You just identify the web search to be done.
-- For each <web_search>, you will write what you want to search on the web to find information to help to answer the question. It must be a sub question.
-- You pay attention that each <web_search> is about a different topic.
-- You use the following structure to answer the question:
-
-    <root>
-        <web_search id="1">
-            sub question to search on the web to find information to help to answer the question
-        </web_search>
-        <web_search id="2">
-            sub question to search on the web to find information to help to answer the question
-        </web_search>
-        ...
-        <web_search id="n">
-            sub question to search on the web to find information to help to answer the question
-        </web_search>
-    </root>
+class WebSearch(BaseModel):
+    """A web search to be done to answer the user request"""
 
-- You have to use this structure to your response and nothing else.
-- There is just one question in each <websearch> tag, no codes, no explanations.
+    query: str = Field(description="List of keywords to search on the web")
 
-"""
 
-structure = """
-    <root>
-        <web_search id="1">
-            List of keywords to search on the web to find information to help to answer the question
-        </web_search>
-        <web_search id="2">
-            List of keywords to search on the web to find information to help to answer the question
-        </web_search>
-        ...
-        <web_search id="n">
-            List of keywords to search on the web to find information to help to answer the question
-        </web_search>
-    </root>
-"""
+class WebSearches(BaseModel):
+    """The web searches to be done to answer the user request"""
+
+    web_search: List[WebSearch] = Field(description="The web searches, one per topic")
+
+
+def parse_web_searches(content):
+    """Return the web searches of a Searcher answer.
+
+    The answer is a `WebSearches` JSON object when the server honours the
+    schema of the `format` option, and the <web_search> XML of the prompt
+    otherwise.
+    """
+    try:
+        web_search = [
+            search.query
+            for search in WebSearches.model_validate_json(content).web_search
+        ]
+    except ValidationError:
+        root = parse_tags(content, tags={"web_search"})
+        web_search = [elem.text for elem in root.find_all("web_search")]
+    return [s.strip() for s in web_search if s.strip()]
+
+
+class WebSearchParser:
+    """Incremental version of `parse_web_searches`.
+
+    `feed` takes the answer chunk by chunk and returns the web searches that
+    the chunk completed: the queries of the `web_search` list of the JSON
+    object, or the <web_search> elements when the server ignores the schema.
+    """
+
+    JSON_LIST = re.compile(r'"web_search"\s*:\s*\[')
+    JSON_QUERY = re.compile(r'"query"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+    def __init__(self):
+        self.tags = TagParser(tags={"web_search"})
+        self._content = ""
+        # position after the last query read in the JSON list
+        self._position = None
+
+    def feed(self, text):
+        self._content += text
+        found = [elem.text for elem in self.tags.feed(text)]
+        if self._position is None:
+            match = self.JSON_LIST.search(self._content)
+            if match is not None:
+                self._position = match.end()
+        if self._position is not None:
+            found = []
+            while True:
+                match = self.JSON_QUERY.search(self._content, self._position)
+                if match is None:
+                    break
+                self._position = match.end()
+                found.append(json.loads(match.group(1)))
+        return [s.strip() for s in found if s.strip()]
+
+    def close(self):
+        found = [elem.text for elem in self.tags.close()]
+        if self._position is not None:
+            return []
+        return [s.strip() for s in found if s.strip()]
 
 
 class Searcher:
-    def __init__(self, **kwargs):
+    def __init__(self, stream=True, search_backend=None, search_workers=4, **kwargs):
         super().__init__(**kwargs)
+        # with `stream`, each web search starts as soon as the model has
+        # written it, while the rest of the answer is generated
+        self.stream = stream
+        self.search = SearchExecutor(
+            search_backend or get_search_backend(), max_workers=search_workers
+        )
 
         OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
         SEARCHER_MODEL = os.getenv("SEARCHER_MODEL")
@@ -106,66 +136,73 @@ class Searcher:
                     "human",
                     """
                     The user request is : {task}. Tell me more about it.
-
-                    {extra}
                     """,
                 ),
             ]
         )
-        llm = ChatOllama(
-            model=SEARCHER_MODEL,
-            seed=42,
-            temperature=0.2,
-            num_ctx=32768,
-            base_url=OLLAMA_BASE_URL,
+        llm = with_cassette(
+            ChatOllama(
+                model=SEARCHER_MODEL,
+                seed=42,
+                temperature=0.2,
+                num_ctx=32768,
+                base_url=OLLAMA_BASE_URL,
+                cache=get_response_cache(),
+                # constrained generation: the answer is parsed in one pass
+                format=WebSearches.model_json_schema(),
+            )
         )
+        self.prompt = prompt
+        self.llm = llm
         self.researcher_llm = prompt | llm
 
     def invoke(self, state, **kwargs):
         """Invoke the agent with the given question and context."""
-        question = state["messages"][-1]
+        question = state["messages"][-1].content
         print("**** Researcher ****")
         # print("question: ", question.content)
         print("question: ", question)
 
-        response = self.researcher_llm.invoke({"task": question, "extra": ""}, **kwargs)
-        iteration = 1
-        length, _ = extract_code_blocks(response.content)
-        while length == 0 and iteration < 3:
-            print("iteration: ", iteration)
-            response = self.researcher_llm.invoke(
-                {
-                    "task": question,
-                    "extra": f"you're previous answer doesn't follow the structure: {structure} \n please changed it accordingly",
-                },
-                **kwargs,
-            )
-            length, _ = extract_code_blocks(response.content)
-            with open(
-                os.path.join(os.getcwd(), f"output/searcher_response_{iteration}.md"),
-                "w",
-            ) as f:
-                f.write(response.content)
-            iteration += 1
-
-        if iteration == 3:
-            raise Exception("No code blocks found in response")
-
-        with open(os.path.join(os.getcwd(), "output/searcher_response.md"), "w") as f:
-            f.write(response.content)
-
-        _, code_blocks = extract_code_blocks(response.content)
-        root = ET.fromstring(code_blocks)
-
-        web_search = []
-        for elem in root.iter():
-            if elem.tag == "web_search":
-                web_search.append(elem.text)
-
-        search_results = []
-        for s in web_search:
+        searches = []
+        for s in self._web_searches(question, **kwargs):
             print("searching: ", s)
-            results = DDGS().text(s)
-            search_results.append(results)
+            searches.append(self.search.submit(s))
+        if not searches:
+            print("no web search found, searching the request")
+            searches.append(self.search.submit(question))
+        search_results = self.search.gather(searches)
+        cache = getattr(self.search.backend, "cache", None)
+        if cache is not None:
+            print("search cache: ", cache.stats())
 
         return {"websearch": search_results}
+
+    def _cache_key(self, question):
+        # the key under which `BaseChatModel` caches the answer to the request
+        messages = self.prompt.invoke({"task": question}).to_messages()
+        return dumps(messages), self.llm._get_llm_string()
+
+    def _web_searches(self, question, **kwargs):
+        """Yield the web searches of the answer as soon as they are complete."""
+        cache = self.llm.cache
+        key = None if cache is None else self._cache_key(question)
+        # a cached answer comes back at once: there is nothing to stream
+        if not self.stream or (key is not None and cache.lookup(*key) is not None):
+            response = self.researcher_llm.invoke({"task": question}, **kwargs)
+            content = response.content
+            yield from parse_web_searches(content)
+        else:
+            parser = WebSearchParser()
+            answer = None
+            for chunk in self.researcher_llm.stream({"task": question}, **kwargs):
+                answer = chunk if answer is None else answer + chunk
+                yield from parser.feed(chunk.content)
+            yield from parser.close()
+            content = answer.content if answer is not None else ""
+            if key is not None and answer is not None:
+                # streamed calls skip the response cache: store the answer
+                message = message_chunk_to_message(answer)
+                cache.update(*key, [ChatGeneration(message=message)])
+
+        with open(os.path.join(os.getcwd(), "output/searcher_response.md"), "w") as f:
+            f.write(content)
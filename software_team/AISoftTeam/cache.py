@@ -0,0 +1,123 @@
+import asyncio
+import os
+import threading
+import time
+
+from langchain_core.outputs import Generation
+from llm4code_common.cache import ResponseCache
+
+from .cassette import get_cassette
+from .metrics import report_usage, usage_of
+
+
+class CachedResult:
+    """Stand-in for an agent run result replayed from the cache."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return f"CachedResult(data={self.data!r})"
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """Return the shared response cache, or None when caching is disabled.
+
+    The cache is enabled by setting `LLM_CACHE_PATH`; `LLM_CACHE_MAX_SIZE`
+    (bytes) and `LLM_CACHE_MAX_AGE` (seconds) tune its eviction.
+    """
+    global _response_cache
+
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+    if _response_cache is None or _response_cache.path != path:
+        max_size = os.getenv("LLM_CACHE_MAX_SIZE")
+        max_age = os.getenv("LLM_CACHE_MAX_AGE")
+        _response_cache = ResponseCache(
+            path,
+            max_size=int(max_size) if max_size else 256 * 2**20,
+            max_age=float(max_age) if max_age else None,
+        )
+    return _response_cache
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _event_loop():
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return _loop
+
+
+def _call(agent, prompt, **kwargs):
+    start = time.perf_counter()
+    # pydantic_ai agents share one async HTTP client, which is bound to the
+    # event loop it was first used in: running every call on the same loop
+    # lets graph runs from several threads use the agents concurrently
+    future = asyncio.run_coroutine_threadsafe(
+        agent.run(prompt, **kwargs), _event_loop()
+    )
+    result = future.result()
+    report_usage(result, time.perf_counter() - start)
+    return result
+
+
+def _run(agent, prompt, llm_string, **kwargs):
+    cassette = get_cassette()
+    if cassette is None:
+        return _call(agent, prompt, **kwargs)
+
+    request = {"llm": llm_string, "prompt": prompt}
+    episode = cassette.lookup("agent", request)
+    if episode is None:
+        start = time.perf_counter()
+        result = _call(agent, prompt, **kwargs)
+        cassette.record(
+            "agent",
+            request,
+            {
+                "value": result.data,
+                "usage": usage_of(result),
+                "duration": time.perf_counter() - start,
+            },
+        )
+        return result
+    cassette.wait(episode["duration"])
+    report_usage(duration=episode["duration"], **episode["usage"])
+    return CachedResult(episode["value"])
+
+
+def run_cached(agent, prompt, system_prompt="", **kwargs):
+    """Run a pydantic_ai agent through the response cache when it is enabled.
+
+    Runs are recorded in, or replayed from, the cassette when one is set.
+    """
+    llm_string = repr(
+        (
+            getattr(agent.model, "model_name", str(agent.model)),
+            agent.model_settings,
+            system_prompt,
+            sorted(kwargs.items()),
+        )
+    )
+    cache = get_response_cache()
+    if cache is None:
+        return _run(agent, prompt, llm_string, **kwargs)
+
+    cached = cache.lookup(prompt, llm_string)
+    if cached is not None:
+        return CachedResult(cached[0].text)
+
+    result = _run(agent, prompt, llm_string, **kwargs)
+    cache.update(prompt, llm_string, [Generation(text=result.data)])
+    return result
@@ -0,0 +1,39 @@
+import os
+
+from llm4code_common.cassette import (  # noqa: F401
+    Cassette,
+    CassetteChatModel,
+    CassetteEmbeddings,
+    CassetteMiss,
+)
+
+
+_cassette = None
+
+
+def get_cassette():
+    """Return the shared cassette, or None when recording is disabled.
+
+    The cassette is enabled by setting `LLM_CASSETTE_PATH`;
+    `LLM_CASSETTE_MODE` is "record" (default) or "replay", and
+    `LLM_CASSETTE_REALTIME=1` replays with the recorded timing.
+    """
+    global _cassette
+
+    path = os.getenv("LLM_CASSETTE_PATH")
+    if not path:
+        return None
+    mode = os.getenv("LLM_CASSETTE_MODE", "record")
+    if _cassette is None or (_cassette.path, _cassette.mode) != (path, mode):
+        _cassette = Cassette(
+            path,
+            mode=mode,
+            realtime=os.getenv("LLM_CASSETTE_REALTIME", "0") not in ("", "0"),
+        )
+    return _cassette
+
+
+def with_cassette(llm):
+    """Return `llm` wrapped in the shared cassette when it is enabled."""
+    cassette = get_cassette()
+    return llm if cassette is None else cassette.wrap(llm)
@@ -0,0 +1,134 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+from .agents.utils import count_tokens
+
+WORD = re.compile(r"\w+")
+# query parameters that do not change the content of a page
+TRACKING = re.compile(r"^(utm_\w+|fbclid|gclid|msclkid|mc_\w+|ref|ref_src|source)$")
+
+
+def canonical_url(url):
+    """Return a canonical form of `url`, equal for the URLs of the same page.
+
+    The scheme, the "www." prefix, the default port, the fragment, the
+    tracking parameters, the order of the query parameters and the trailing
+    slash are ignored.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING.match(key.lower())
+    )
+    path = parts.path.rstrip("/")
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+
+def simhash(text, bits=64, shingle=3):
+    """SimHash of the word `shingle`s of `text`.
+
+    Texts sharing most of their shingles have hashes differing in a few bits.
+    Texts without any word have no hash: None is returned.
+    """
+    words = WORD.findall(text.lower())
+    if not words:
+        return None
+    if len(words) < shingle:
+        features = [" ".join(words)]
+    else:
+        features = [
+            " ".join(words[i : i + shingle]) for i in range(len(words) - shingle + 1)
+        ]
+    digests = b"".join(
+        hashlib.blake2b(feature.encode(), digest_size=bits // 8).digest()
+        for feature in features
+    )
+    # one row of bits per feature: a bit of the hash is set when it is set in
+    # the majority of the features
+    votes = np.unpackbits(
+        np.frombuffer(digests, dtype=np.uint8).reshape(-1, bits // 8), axis=1
+    )
+    majority = 2 * votes.sum(axis=0) > len(features)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+class Deduplicator:
+    """Remove the duplicated web search results.
+
+    A result is dropped when its URL has the same canonical form as the one of
+    a previous result, or when the SimHash of its title and snippet differs
+    from the one of a previous result by at most `distance` bits. The first
+    occurrence, in the order of the searches, is kept. Snippets are short: a
+    few words cut or added already flip about 10 of the 64 bits, while
+    unrelated snippets differ by about 32 bits. The results without any word
+    in their title and snippet are only compared by URL.
+
+    The hashes are split in `distance + 1` bands: two near duplicates have at
+    least one identical band, so that only the results sharing a band are
+    compared.
+    """
+
+    def __init__(self, distance=10, bits=64):
+        self.distance = distance
+        self.bits = bits
+        self.removed = 0
+        self.tokens_saved = 0
+
+    def _bands(self, h):
+        nb_bands = self.distance + 1
+        width = -(-self.bits // nb_bands)
+        mask = (1 << width) - 1
+        return [(band, h >> (band * width) & mask) for band in range(nb_bands)]
+
+    def deduplicate(self, websearch):
+        """Return `websearch`, a list of result lists, without its duplicates,
+        with the number of results removed and of tokens saved."""
+        urls = set()
+        buckets = {}
+        removed = tokens_saved = 0
+        deduplicated = []
+        for results in websearch:
+            kept = []
+            for result in results:
+                if not isinstance(result, dict):
+                    kept.append(result)
+                    continue
+                url = canonical_url(result.get("href", ""))
+                h = simhash(
+                    f"{result.get('title', '')} {result.get('body', '')}", self.bits
+                )
+                bands = self._bands(h) if h is not None else []
+                candidates = {c for band in bands for c in buckets.get(band, ())}
+                if (url and url in urls) or any(
+                    bin(h ^ c).count("1") <= self.distance for c in candidates
+                ):
+                    removed += 1
+                    tokens_saved += count_tokens(str(result))
+                    continue
+                if url:
+                    urls.add(url)
+                for band in bands:
+                    buckets.setdefault(band, []).append(h)
+                kept.append(result)
+            deduplicated.append(kept)
+        return deduplicated, removed, tokens_saved
+
+    def invoke(self, state, **kwargs):
+        websearch, removed, tokens_saved = self.deduplicate(state["websearch"])
+        self.removed += removed
+        self.tokens_saved += tokens_saved
+        total = sum(len(results) for results in state["websearch"])
+        print(
+            f"dedup: removed {removed} of {total} results, "
+            f"~{tokens_saved} tokens saved"
+        )
+        return {"websearch": websearch}
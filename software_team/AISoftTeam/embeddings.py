@@ -0,0 +1,314 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .cassette import with_cassette
+
+
+class EmbeddingStore:
+    """On-disk store of embedding vectors keyed by (model, sha256 of the text).
+
+    The vectors of each model are rows of a float32 memory-mapped file, grown
+    by doubling; a SQLite index maps the keys to their rows. Vectors are
+    flushed before their rows are indexed, so a crash never indexes a
+    partially written vector.
+    """
+
+    def __init__(self, path="embedding_cache"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._arrays = {}
+
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS models (
+                    model TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    size INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vectors (
+                    model TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )
+                """
+            )
+
+    def __repr__(self):
+        return f"EmbeddingStore({self.path!r})"
+
+    @staticmethod
+    def hash(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _model(self, model):
+        return self._conn.execute(
+            "SELECT filename, dim, size FROM models WHERE model = ?", (model,)
+        ).fetchone()
+
+    def _array(self, filename, dim, capacity=0):
+        """The memory map of `filename`, with room for `capacity` vectors."""
+        array = self._arrays.get(filename)
+        path = os.path.join(self.path, filename)
+        if array is not None and array.shape[0] >= capacity:
+            return array
+        if array is not None:
+            array.flush()
+            capacity = max(capacity, 2 * array.shape[0])
+        rows = os.path.getsize(path) // (4 * dim) if os.path.exists(path) else 0
+        if rows < capacity:
+            with open(path, "ab") as f:
+                f.truncate(capacity * dim * 4)
+            rows = capacity
+        array = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, dim))
+        self._arrays[filename] = array
+        return array
+
+    def _rows(self, model, hashes):
+        """The rows of the known `hashes` as a dict."""
+        rows = {}
+        # SQLite limits the number of parameters of a query
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start : start + 500]
+            rows.update(
+                self._conn.execute(
+                    "SELECT hash, row FROM vectors WHERE model = ? AND hash IN"
+                    f" ({','.join('?' * len(batch))})",
+                    (model, *batch),
+                ).fetchall()
+            )
+        return rows
+
+    def get(self, model, hashes):
+        """Return the known vectors of `hashes` as a dict."""
+        with self._lock:
+            info = self._model(model)
+            if info is None:
+                return {}
+            filename, dim, _ = info
+            array = self._array(filename, dim)
+            rows = self._rows(model, list(hashes))
+            return {h: np.array(array[row]) for h, row in rows.items()}
+
+    def put(self, model, hashes, vectors):
+        """Store the `vectors` of `hashes` that are not in the store yet."""
+        with self._lock, self._conn:
+            known = self._rows(model, list(hashes))
+            # the same text may be stored concurrently or twice in a batch:
+            # only the first vector of each new hash gets a row
+            new = {}
+            for h, vector in zip(hashes, vectors):
+                if h not in known:
+                    new.setdefault(h, vector)
+            if not new:
+                return
+            vectors = np.asarray(list(new.values()), dtype=np.float32)
+            info = self._model(model)
+            if info is None:
+                filename = self.hash(model)[:16] + ".f32"
+                dim, size = vectors.shape[1], 0
+                self._conn.execute(
+                    "INSERT INTO models VALUES (?, ?, ?, 0)", (model, filename, dim)
+                )
+            else:
+                filename, dim, size = info
+            array = self._array(filename, dim, max(1024, size + len(vectors)))
+            array[size : size + len(vectors)] = vectors
+            array.flush()
+            self._conn.executemany(
+                "INSERT INTO vectors VALUES (?, ?, ?)",
+                [(model, h, size + i) for i, h in enumerate(new)],
+            )
+            self._conn.execute(
+                "UPDATE models SET size = ? WHERE model = ?",
+                (size + len(vectors), model),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+
+class EmbeddingService:
+    """Embed texts in batches, through a cache of the vectors already computed.
+
+    `embed_documents` is the embedding function of the underlying model, a
+    callable taking a list of texts. The texts missing from the `store` are
+    deduplicated and sent in batches of `batch_size` texts, `max_workers`
+    batches at a time. `calls`, `hits` and `misses` count the batches sent
+    and the texts found, or not, in the store.
+    """
+
+    def __init__(
+        self, embed_documents, model, batch_size=32, max_workers=4, store=None
+    ):
+        self.embed_documents = embed_documents
+        self.model = model
+        self.batch_size = batch_size
+        self.store = store
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="embed"
+        )
+        # vectors of this process, when there is no store
+        self._memory = {}
+
+    def __repr__(self):
+        return f"EmbeddingService({self.model!r}, store={self.store!r})"
+
+    def _lookup(self, hashes):
+        if self.store is not None:
+            return self.store.get(self.model, hashes)
+        with self._lock:
+            return {h: self._memory[h] for h in hashes if h in self._memory}
+
+    def _save(self, hashes, vectors):
+        if self.store is not None:
+            self.store.put(self.model, hashes, vectors)
+        else:
+            with self._lock:
+                self._memory.update(zip(hashes, vectors))
+
+    def _embed_batch(self, texts):
+        with self._lock:
+            self.calls += 1
+        return self.embed_documents(texts)
+
+    def embed(self, texts):
+        """Return the embeddings of `texts` as lists of floats."""
+        hashes = [EmbeddingStore.hash(text) for text in texts]
+        vectors = self._lookup(set(hashes))
+        missing = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            missing_hashes = list(missing)
+            batches = [
+                missing_hashes[start : start + self.batch_size]
+                for start in range(0, len(missing_hashes), self.batch_size)
+            ]
+            results = self._pool.map(
+                self._embed_batch, [[missing[h] for h in batch] for batch in batches]
+            )
+            for batch, embeddings in zip(batches, results):
+                self._save(batch, embeddings)
+                vectors.update(zip(batch, embeddings))
+        return [np.asarray(vectors[h], dtype=float).tolist() for h in hashes]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "hits": self.hits, "misses": self.misses}
+
+
+class LangChainEmbeddings(Embeddings):
+    """LangChain embedding model backed by an `EmbeddingService`."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def embed_documents(self, texts):
+        return self.service.embed(texts)
+
+    def embed_query(self, text):
+        return self.service.embed([text])[0]
+
+
+@functools.cache
+def _llama_index_embedding_class():
+    from llama_index.core.bridge.pydantic import PrivateAttr
+    from llama_index.core.embeddings import BaseEmbedding
+
+    class LlamaIndexEmbedding(BaseEmbedding):
+        """LlamaIndex embedding model backed by an `EmbeddingService`."""
+
+        _service = PrivateAttr()
+
+        def __init__(self, service, **kwargs):
+            # the service does the batching
+            super().__init__(model_name=service.model, embed_batch_size=2048, **kwargs)
+            self._service = service
+
+        @classmethod
+        def class_name(cls):
+            return "EmbeddingServiceEmbedding"
+
+        def _get_query_embedding(self, query):
+            return self._service.embed([query])[0]
+
+        def _get_text_embedding(self, text):
+            return self._service.embed([text])[0]
+
+        def _get_text_embeddings(self, texts):
+            return self._service.embed(texts)
+
+        async def _aget_query_embedding(self, query):
+            return self._get_query_embedding(query)
+
+    return LlamaIndexEmbedding
+
+
+def llama_index_embedding(service):
+    """Return a LlamaIndex embedding model backed by `service`."""
+    return _llama_index_embedding_class()(service)
+
+
+_services = {}
+_store = None
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model=None, base_url=None):
+    """Return the shared embedding service of an Ollama embedding model.
+
+    `model` and `base_url` default to `EMBED_MODEL` and `OLLAMA_BASE_URL`.
+    The vectors are stored in `EMBED_CACHE_PATH` ("embedding_cache" by
+    default, kept in memory when empty); `EMBED_BATCH_SIZE` and
+    `EMBED_WORKERS` set the size and the number of concurrent batches.
+    """
+    global _store
+
+    model = model or os.getenv("EMBED_MODEL")
+    base_url = base_url or os.getenv("OLLAMA_BASE_URL")
+    path = os.getenv("EMBED_CACHE_PATH", "embedding_cache")
+    with _services_lock:
+        if path and (_store is None or _store.path != path):
+            _store = EmbeddingStore(path)
+            _services.clear()
+        store = _store if path else None
+        key = (model, base_url, store is not None)
+        if key not in _services:
+            from langchain_ollama.embeddings import OllamaEmbeddings
+
+            embeddings = with_cassette(OllamaEmbeddings(model=model, base_url=base_url))
+            batch_size = os.getenv("EMBED_BATCH_SIZE")
+            max_workers = os.getenv("EMBED_WORKERS")
+            _services[key] = EmbeddingService(
+                embeddings.embed_documents,
+                model,
+                batch_size=int(batch_size) if batch_size else 32,
+                max_workers=int(max_workers) if max_workers else 4,
+                store=store,
+            )
+        return _services[key]
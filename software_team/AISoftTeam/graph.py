@@ -3,7 +3,8 @@ from langgraph.graph.message import add_messages
 from typing_extensions import TypedDict
 from typing import Annotated
 
-from .agents import Analyst, coordinator, Coder, Tester, Searcher, Coder_2
+from . import agents
+from .dedup import Deduplicator
 from .agents.coordinator import Steps
 
 
@@ -16,27 +17,39 @@ class State(TypedDict):
     current_step: int
 
 
-def create_team():
+def _compile(graph, metrics):
+    app = graph.compile()
+    if metrics is not None:
+        # `MetricsCollector` recording per-node metrics of every run
+        app = app.with_config(callbacks=[metrics])
+    return app
+
+
+def create_team(metrics=None):
     graph = StateGraph(State)
-    graph.add_node("researcher", Searcher().invoke)
-    graph.add_node("analyst", Analyst().invoke)
-    graph.add_node("coordinator", coordinator)
-    graph.add_node("coder", Coder().invoke)
-    graph.add_node("tester", Tester().invoke)
+    graph.add_node("researcher", agents.Searcher().invoke)
+    graph.add_node("dedup", Deduplicator().invoke)
+    graph.add_node("analyst", agents.Analyst().invoke)
+    graph.add_node("coordinator", agents.coordinator)
+    graph.add_node("coder", agents.Coder().invoke)
+    graph.add_node("tester", agents.Tester().invoke)
     graph.add_edge(START, "researcher")
-    graph.add_edge("researcher", "analyst")
+    graph.add_edge("researcher", "dedup")
+    graph.add_edge("dedup", "analyst")
     graph.add_edge("analyst", "coordinator")
     graph.add_edge("coordinator", "coder")
     graph.add_edge("coder", "tester")
     graph.add_edge("tester", END)
-    return graph.compile()
+    return _compile(graph, metrics)
 
 
-def create_small_team():
+def create_small_team(metrics=None):
     graph = StateGraph(State)
-    graph.add_node("researcher", Searcher().invoke)
-    graph.add_node("coder", Coder_2().invoke)
+    graph.add_node("researcher", agents.Searcher().invoke)
+    graph.add_node("dedup", Deduplicator().invoke)
+    graph.add_node("coder", agents.Coder_2().invoke)
     graph.add_edge(START, "researcher")
-    graph.add_edge("researcher", "coder")
+    graph.add_edge("researcher", "dedup")
+    graph.add_edge("dedup", "coder")
     graph.add_edge("coder", END)
-    return graph.compile()
+    return _compile(graph, metrics)
@@ -0,0 +1,31 @@
+from langchain_core.callbacks import dispatch_custom_event
+from llm4code_common.metrics import MetricsCollector  # noqa: F401
+
+
+def usage_of(result):
+    """Return the usage of a pydantic_ai run result as a dict."""
+    usage = result.usage()
+    requests = getattr(usage, "requests", 1)
+    return {
+        "requests": requests,
+        "prompt_tokens": getattr(usage, "request_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "response_tokens", 0) or 0,
+        "retries": max(requests - 1, 0),
+    }
+
+
+def report_usage(result=None, duration=0.0, **data):
+    """Report the usage of a model call made outside of LangChain.
+
+    `result` is a pydantic_ai run result; the event is picked up by the
+    `MetricsCollector` of the running graph, and ignored outside of a graph.
+    """
+    if result is not None and hasattr(result, "usage"):
+        for key, value in usage_of(result).items():
+            data.setdefault(key, value)
+    data["duration"] = duration
+    try:
+        dispatch_custom_event("llm_usage", data)
+    except RuntimeError:
+        # not called from a runnable
+        pass
@@ -0,0 +1,379 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from .cassette import get_cassette
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second, with bursts of `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SearchBackend:
+    """Interface of the web search backends.
+
+    `search` returns a list of results, dicts with "title", "href" and "body"
+    keys. The calls of all the users of a backend share its rate limiter,
+    `rate` being the maximum number of searches per second.
+    """
+
+    name = "backend"
+
+    def __init__(self, rate=None, burst=1):
+        self.rate_limiter = RateLimiter(rate, burst) if rate else None
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+    def search(self, query, max_results=10):
+        raise NotImplementedError
+
+    def limited_search(self, query, max_results=10):
+        """`search` once the rate limiter allows it."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return self.search(query, max_results=max_results)
+
+
+class DuckDuckGoBackend(SearchBackend):
+    """DuckDuckGo text search, through the cassette when one is set.
+
+    The HTTP client is created once per worker thread and reused by all
+    its searches.
+    """
+
+    name = "duckduckgo"
+
+    def __init__(self, rate=1.0, burst=5):
+        super().__init__(rate, burst)
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        if not hasattr(self._local, "client"):
+            from duckduckgo_search import DDGS
+
+            self._local.client = DDGS()
+        return self._local.client
+
+    def search(self, query, max_results=10):
+        cassette = get_cassette()
+        if cassette is None:
+            return self.client.text(query, max_results=max_results)
+        return cassette.call(
+            "ddgs",
+            query,
+            lambda: self.client.text(query, max_results=max_results),
+        )
+
+
+class LocalIndexBackend(SearchBackend):
+    """In-memory keyword index over a fixed list of documents.
+
+    Documents are ranked by the number of query words found in their title
+    and body. Useful as an offline stand-in for tests and benchmarks.
+    """
+
+    name = "local"
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, documents, rate=None, burst=1):
+        super().__init__(rate, burst)
+        self.documents = list(documents)
+        self._words = [
+            set(self.WORD.findall(f"{d.get('title', '')} {d.get('body', '')}".lower()))
+            for d in self.documents
+        ]
+
+    def __repr__(self):
+        return f"LocalIndexBackend({len(self.documents)} documents)"
+
+    @classmethod
+    def from_json(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def search(self, query, max_results=10):
+        words = set(self.WORD.findall(query.lower()))
+        scores = [
+            (len(words & document_words), i)
+            for i, document_words in enumerate(self._words)
+        ]
+        ranked = sorted((s for s in scores if s[0] > 0), key=lambda s: (-s[0], s[1]))
+        return [self.documents[i] for _, i in ranked[:max_results]]
+
+
+class SearchCache:
+    """Persistent SQLite cache of search results.
+
+    Queries are normalised before lookup: case, whitespace and the order of
+    the keywords do not matter. Entries older than `max_age` seconds are
+    ignored and dropped; above `max_entries` entries, the least recently used
+    ones are evicted. `hits` and `misses` count the lookups of this process.
+    """
+
+    def __init__(self, path="search_cache.sqlite", max_entries=10000, max_age=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS searches (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+
+    def __repr__(self):
+        return f"SearchCache({self.path!r})"
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(sorted(query.lower().split()))
+
+    def key(self, backend, query, max_results):
+        return f"{backend}\0{max_results}\0{self.normalize(query)}"
+
+    def lookup(self, backend, query, max_results=10):
+        key = self.key(backend, query, max_results)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created FROM searches WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (
+                self.max_age is not None and now - row[1] > self.max_age
+            ):
+                self._conn.execute("DELETE FROM searches WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE searches SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def update(self, backend, query, max_results, results):
+        key = self.key(backend, query, max_results)
+        value = json.dumps(results, default=str)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        if self.max_age is not None:
+            self._conn.execute(
+                "DELETE FROM searches WHERE created < ?", (now - self.max_age,)
+            )
+        if self.max_entries is None:
+            return
+        self._conn.execute(
+            """
+            DELETE FROM searches WHERE key IN (
+                SELECT key FROM searches ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM searches")
+
+
+class CachedBackend(SearchBackend):
+    """Search `backend` through a `SearchCache`.
+
+    Cached queries are answered without waiting for the rate limiter of the
+    backend, and concurrent searches of the same normalised query wait for a
+    single backend call. Empty results are not cached.
+    """
+
+    def __init__(self, backend, cache):
+        super().__init__()
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+        self._lock = threading.Lock()
+        self._query_locks = {}
+
+    def __repr__(self):
+        return f"CachedBackend({self.backend!r}, {self.cache!r})"
+
+    def search(self, query, max_results=10):
+        key = self.cache.key(self.name, query, max_results)
+        with self._lock:
+            # [lock, number of searches using it]: dropped by the last one
+            query_lock = self._query_locks.setdefault(key, [threading.Lock(), 0])
+            query_lock[1] += 1
+        try:
+            with query_lock[0]:
+                results = self.cache.lookup(self.name, query, max_results)
+                if results is None:
+                    results = self.backend.limited_search(
+                        query, max_results=max_results
+                    )
+                    if results:
+                        self.cache.update(self.name, query, max_results, results)
+        finally:
+            with self._lock:
+                query_lock[1] -= 1
+                if query_lock[1] == 0:
+                    del self._query_locks[key]
+        return results
+
+
+class SearchExecutor:
+    """Run the searches of a backend concurrently.
+
+    `submit` starts a search right away in a thread pool; `gather` waits for
+    the results. A search failing or taking more than `timeout` seconds from
+    its submission gives an empty result instead of failing the whole batch.
+    """
+
+    def __init__(self, backend, max_workers=4, timeout=20.0, max_results=10):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_results = max_results
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="search"
+        )
+
+    def submit(self, query):
+        future = self._pool.submit(
+            self.backend.limited_search, query, max_results=self.max_results
+        )
+        future.query = query
+        future.deadline = time.monotonic() + self.timeout
+        return future
+
+    def gather(self, futures):
+        results = []
+        for future in futures:
+            try:
+                timeout = max(future.deadline - time.monotonic(), 0)
+                results.append(future.result(timeout=timeout))
+            except TimeoutError:
+                future.cancel()
+                print(f"search timed out: {future.query}")
+                results.append([])
+            except Exception as e:
+                print(f"search failed: {future.query}: {e!r}")
+                results.append([])
+        return results
+
+    def search(self, queries):
+        """Return the results of all the `queries`, in order."""
+        return self.gather([self.submit(query) for query in queries])
+
+
+_search_backend = None
+_search_cache = None
+
+
+def get_search_cache():
+    """Return the shared search cache, or None when it is disabled.
+
+    The cache is enabled by setting `SEARCH_CACHE_PATH`;
+    `SEARCH_CACHE_MAX_ENTRIES` and `SEARCH_CACHE_MAX_AGE` (seconds) tune its
+    eviction.
+    """
+    global _search_cache
+
+    path = os.getenv("SEARCH_CACHE_PATH")
+    if not path:
+        return None
+    if _search_cache is None or _search_cache.path != path:
+        max_entries = os.getenv("SEARCH_CACHE_MAX_ENTRIES")
+        max_age = os.getenv("SEARCH_CACHE_MAX_AGE")
+        _search_cache = SearchCache(
+            path,
+            max_entries=int(max_entries) if max_entries else 10000,
+            max_age=float(max_age) if max_age else 24 * 3600,
+        )
+    return _search_cache
+
+
+def get_search_backend():
+    """Return the shared search backend.
+
+    `SEARCH_BACKEND` is "duckduckgo" (default) or "local", in which case the
+    documents are read from the JSON file `SEARCH_INDEX`; `SEARCH_RATE` is
+    the maximum number of searches per second. The backend goes through the
+    search cache when it is enabled.
+    """
+    global _search_backend
+
+    name = os.getenv("SEARCH_BACKEND", "duckduckgo")
+    rate = os.getenv("SEARCH_RATE")
+    cache = get_search_cache()
+    if (
+        _search_backend is None
+        or _search_backend.name != name
+        or getattr(_search_backend, "cache", None) is not cache
+    ):
+        if name == "local":
+            backend = LocalIndexBackend.from_json(
+                os.getenv("SEARCH_INDEX"), rate=float(rate) if rate else None
+            )
+        elif name == "duckduckgo":
+            backend = DuckDuckGoBackend(rate=float(rate) if rate else 1.0)
+        else:
+            raise ValueError(f"unknown search backend {name!r}")
+        _search_backend = backend if cache is None else CachedBackend(backend, cache)
+    return _search_backend
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("benchmarks", "common", "software_team", "langchain_version"):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+from fake_llm_server import serve  # noqa: E402
+
+ROLES = ("supervisor", "junior", "reviewer")
+
+
+@pytest.fixture(scope="session")
+def server():
+    server = serve(latency=0.05, token_rate=2000.0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def llm(server):
+    """The simulated model of the fake server, with its statistics reset."""
+    server.llm.reset()
+    return server.llm
+
+
+@pytest.fixture
+def feature_graph(server, llm, tmp_path, monkeypatch):
+    """Factory of FeatureGraphs whose agents all talk to the fake server."""
+    import src
+    from src.agents.clients import clear_clients
+
+    # the reviewer writes the current code in the working directory
+    monkeypatch.chdir(tmp_path)
+    options = {"base_url": server.url}
+
+    def build(**kwargs):
+        kwargs.setdefault("agent_options", {role: options for role in ROLES})
+        return src.FeatureGraph(**kwargs)
+
+    yield build
+    clear_clients()
+
+
+def max_overlap(intervals):
+    """Largest number of intervals running at the same time."""
+    events = sorted(
+        [(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals]
+    )
+    current = largest = 0
+    for _, step in events:
+        current += step
+        largest = max(largest, current)
+    return largest
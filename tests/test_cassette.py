@@ -0,0 +1,29 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from llm4code_common.cassette import Cassette, CassetteMiss
+
+QUERY = "Write a function returning the sum of two numbers."
+
+
+def test_replay_of_a_recorded_run(feature_graph, llm, tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    first = feature_graph(nb_juniors=2, cassette=Cassette(path)).invoke(QUERY)
+    assert llm.stats()["requests"] == 4
+
+    llm.reset()
+    cassette = Cassette(path, mode="replay")
+    second = feature_graph(nb_juniors=2, cassette=cassette).invoke(QUERY)
+    assert llm.stats()["requests"] == 0
+    assert second["current_code"] == first["current_code"]
+
+
+def test_embeddings(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    embeddings = Cassette(path).wrap(DeterministicFakeEmbedding(size=4))
+    vectors = embeddings.embed_documents(["a", "b"])
+
+    replay = Cassette(path, mode="replay").wrap(DeterministicFakeEmbedding(size=4))
+    assert replay.embed_documents(["a", "b"]) == vectors
+    with pytest.raises(CassetteMiss):
+        replay.embed_query("c")
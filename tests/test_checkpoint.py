@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+QUERY = "Write a function returning the sum of two numbers."
+
+
+def checkpoints(graph, session_id):
+    config = {"configurable": {"thread_id": session_id}}
+    return list(graph.memory.list(config))
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test_sessions_are_pruned(feature_graph, tmp_path, persistent):
+    path = str(tmp_path / "checkpoints.sqlite") if persistent else None
+    graph = feature_graph(nb_juniors=1, checkpoint_path=path, keep_checkpoints=3)
+
+    first = graph.invoke(QUERY, session_id="session")
+    second = asyncio.run(graph.ainvoke(QUERY, session_id="session"))
+
+    assert len(checkpoints(graph, "session")) == 3
+    # the session resumes from its most recent checkpoint
+    assert len(second["messages"]) == 2 * len(first["messages"])
+
+
+def test_pruning_drops_unused_channel_values(feature_graph):
+    graph = feature_graph(nb_juniors=1, keep_checkpoints=1)
+
+    for _ in range(3):
+        graph.invoke(QUERY, session_id="session")
+
+    (checkpoint,) = checkpoints(graph, "session")
+    versions = checkpoint.checkpoint["channel_versions"]
+    assert len(graph.memory.blobs) == len(versions)
+    checkpoint_id = checkpoint.config["configurable"]["checkpoint_id"]
+    assert set(graph.memory.writes) <= {("session", "", checkpoint_id)}
+
+
+def test_sessions_are_in_memory_by_default(feature_graph, tmp_path):
+    feature_graph(nb_juniors=1).invoke(QUERY)
+
+    assert not list(tmp_path.glob("*.sqlite"))
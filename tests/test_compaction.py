@@ -0,0 +1,46 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.agents.compaction import compact_messages, count_tokens
+
+QUERY = "Write a function returning the sum of two numbers."
+
+
+def test_compaction_keeps_the_system_prompt_and_the_request():
+    messages = [
+        SystemMessage("system"),
+        HumanMessage("first request " * 50),
+        AIMessage("first answer " * 50),
+        HumanMessage("second request"),
+        AIMessage("second answer"),
+        HumanMessage("latest request"),
+    ]
+
+    kept = [messages[0]] + messages[3:]
+
+    assert compact_messages(messages, count_tokens(kept)) == kept
+
+
+def test_compaction_of_system_messages_only():
+    messages = [SystemMessage("first " * 100), SystemMessage("second " * 100)]
+
+    assert compact_messages(messages, 10) == messages
+
+
+def test_compaction_keeps_the_latest_answer():
+    messages = [SystemMessage("system"), HumanMessage("request " * 100)]
+    messages.append(AIMessage("answer"))
+
+    assert compact_messages(messages, 10) == [messages[0], messages[2]]
+
+
+def test_session_history_is_trimmed(feature_graph):
+    graph = feature_graph(nb_juniors=1, history_budget=1)
+
+    for _ in range(3):
+        result = graph.invoke(QUERY, session_id="session")
+
+    # the last answer of the previous query, then the latest query, its
+    # analysis and its review
+    messages = result["messages"]
+    assert len(messages) == 4
+    assert messages[1].content == QUERY
@@ -0,0 +1,53 @@
+from AISoftTeam.agents.utils import TagParser
+from AISoftTeam.dedup import Deduplicator, canonical_url
+
+SNIPPET = (
+    "NetworkX is a Python package for the creation, manipulation, and study "
+    "of the structure, dynamics, and functions of complex networks"
+)
+
+
+def result(href, body, title="NetworkX"):
+    return {"href": href, "title": title, "body": body}
+
+
+def test_canonical_url():
+    assert canonical_url("https://www.example.org/page/?b=2&a=1&utm_source=x#top") == (
+        canonical_url("http://example.org:443/page?a=1&b=2")
+    )
+    assert canonical_url("https://example.org/page?id=1") != canonical_url(
+        "https://example.org/page?id=2"
+    )
+
+
+def test_deduplicate():
+    websearch = [
+        [
+            result("https://networkx.org/", SNIPPET),
+            result("https://numpy.org/", "NumPy arrays", title="NumPy"),
+        ],
+        [
+            # same page
+            result("https://www.networkx.org/?utm_source=search", "other text"),
+            # same snippet, cut by a few words
+            result("https://pypi.org/project/networkx", SNIPPET.rsplit(" ", 3)[0]),
+            # no word: only compared by URL
+            result("https://example.org/a", "", title=""),
+            result("https://example.org/b", "", title=""),
+        ],
+    ]
+
+    deduplicated, removed, tokens_saved = Deduplicator().deduplicate(websearch)
+
+    assert deduplicated == [websearch[0], websearch[1][2:]]
+    assert removed == 2
+    assert tokens_saved > 0
+
+
+def test_tag_parser_keeps_unknown_tags_as_text():
+    parser = TagParser(tags={"web_search"})
+    chunks = ["<web_search>a <b>bold</b", "> query</web_search><web_se", "arch>x"]
+
+    elements = [element for chunk in chunks for element in parser.feed(chunk)]
+    assert [element.text for element in elements] == ["a <b>bold</b> query"]
+    assert [element.text for element in parser.close()] == ["x"]
@@ -0,0 +1,54 @@
+import threading
+
+import numpy as np
+
+from AISoftTeam.embeddings import EmbeddingService, EmbeddingStore
+
+MODEL = "fake-embed"
+
+
+def size(store):
+    return store._model(MODEL)[2]
+
+
+def test_store_only_adds_new_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"))
+
+    store.put(MODEL, ["a", "b", "a"], [[1, 0], [0, 1], [2, 2]])
+    store.put(MODEL, ["b", "c"], [[3, 3], [1, 1]])
+
+    assert len(store) == size(store) == 3
+    vectors = store.get(MODEL, ["a", "b", "c", "d"])
+    assert {h: v.tolist() for h, v in vectors.items()} == {
+        "a": [1, 0],
+        "b": [0, 1],
+        "c": [1, 1],
+    }
+
+
+def test_services_sharing_a_store(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"))
+    texts = [f"text {i}" for i in range(100)]
+    barrier = threading.Barrier(2)
+
+    def embed_documents(texts):
+        return [[len(text), float(text.split()[1])] for text in texts]
+
+    def embed():
+        # both services miss every text, then store the same vectors
+        service = EmbeddingService(embed_documents, MODEL, store=store)
+        barrier.wait()
+        return service.embed(texts + texts[:10])
+
+    threads = [threading.Thread(target=embed) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store) == size(store) == len(texts)
+    hashes = [EmbeddingStore.hash(text) for text in texts]
+    vectors = store.get(MODEL, hashes)
+    assert np.array_equal(
+        [vectors[h] for h in hashes], np.asarray(embed_documents(texts))
+    )
@@ -0,0 +1,63 @@
+import asyncio
+
+from conftest import max_overlap
+
+QUERY = "Write a function returning the sum of two numbers."
+
+
+def test_invoke(feature_graph, llm):
+    graph = feature_graph(nb_juniors=2)
+
+    result = graph.invoke(QUERY)
+
+    # supervisor, two juniors and reviewer
+    assert llm.stats()["requests"] == 4
+    assert "def solution" in result["current_code"]
+
+
+def test_ainvoke_runs_the_juniors_concurrently(feature_graph, llm):
+    graph = feature_graph(nb_juniors=3)
+
+    result = asyncio.run(graph.ainvoke(QUERY))
+
+    stats = llm.stats()
+    assert stats["requests"] == 5
+    assert max_overlap(stats["intervals"]) == 3
+    assert "def solution" in result["current_code"]
+
+
+def test_max_concurrency(feature_graph, llm):
+    graph = feature_graph(nb_juniors=3, max_concurrency=1)
+
+    asyncio.run(graph.ainvoke(QUERY))
+
+    stats = llm.stats()
+    assert stats["requests"] == 5
+    assert max_overlap(stats["intervals"]) == 1
+
+
+def test_astream(feature_graph, llm):
+    graph = feature_graph(nb_juniors=2)
+
+    async def nodes():
+        return [
+            node
+            for update in [u async for u in graph.astream(QUERY)]
+            for node in update
+        ]
+
+    assert set(asyncio.run(nodes())) == {"analyse", "junior", "reviewing"}
+
+
+def test_response_cache(feature_graph, llm, tmp_path):
+    from src.agents import ResponseCache
+
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    first = feature_graph(nb_juniors=2, cache=cache).invoke(QUERY)
+    assert llm.stats()["requests"] == 4
+
+    # a new graph, as in a new run: the messages get new ids
+    llm.reset()
+    second = feature_graph(nb_juniors=2, cache=cache).invoke(QUERY)
+    assert llm.stats()["requests"] == 0
+    assert second["current_code"] == first["current_code"]
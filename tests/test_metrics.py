@@ -0,0 +1,32 @@
+import time
+from uuid import uuid4
+
+from llm4code_common.metrics import MetricsCollector
+
+
+def start_node(collector, root, node, step):
+    run_id = uuid4()
+    metadata = {"langgraph_node": node, "langgraph_step": step}
+    collector.on_chain_start(
+        {}, {}, run_id=run_id, parent_run_id=root, metadata=metadata, name=node
+    )
+    return run_id
+
+
+def test_concurrent_runs_keep_their_supersteps():
+    collector = MetricsCollector()
+    first, second = uuid4(), uuid4()
+    for root in (first, second):
+        collector.on_chain_start({}, {}, run_id=root, name="LangGraph")
+
+    junior = start_node(collector, first, "junior", 1)
+    time.sleep(0.05)
+    # the other run ends while the superstep of the first one is running
+    collector.on_chain_end({}, run_id=second)
+    other_junior = start_node(collector, first, "junior", 1)
+    for run_id in (junior, other_junior, first):
+        collector.on_chain_end({}, run_id=run_id)
+
+    waits = [record["queue_wait"] for record in collector.records]
+    assert waits[0] < 0.05 <= waits[1]
+    assert not collector._step_start
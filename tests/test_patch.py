@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from src.agents import Reviewer
+from src.agents.patch import PatchError, apply_patch
+from src.agents.validator import check_solution
+
+CODE = "def add(a, b):\n    return a + b\n"
+
+
+def answer(version):
+    return f"""```diff
+--- current_code version {version}
++++ current_code
+@@ -1,2 +1,5 @@
+ def add(a, b):
+     return a + b
++
++
++assert add(1, 2) == 3
+```"""
+
+
+def test_apply_patch_checks_the_version():
+    diff = answer(2).split("\n", 1)[1].rsplit("\n", 1)[0]
+
+    assert apply_patch(CODE, diff, version=2).endswith("assert add(1, 2) == 3\n")
+    with pytest.raises(PatchError, match="version 2, the code is version 3"):
+        apply_patch(CODE, diff, version=3)
+    with pytest.raises(PatchError, match="does not give the version"):
+        apply_patch(CODE, diff.split("\n", 1)[1], version=2)
+
+
+def test_stale_solutions_fail_the_validation():
+    assert check_solution(CODE, answer(1), patch_mode=True, version=1)["ok"]
+
+    result = check_solution(CODE, answer(0), patch_mode=True, version=1)
+    assert (result["ok"], result["stage"]) == (False, "patch")
+
+
+@pytest.mark.parametrize("version, applied", [(1, True), (0, False)])
+def test_reviewer_patch(tmp_path, monkeypatch, version, applied):
+    monkeypatch.chdir(tmp_path)
+    reviewer = Reviewer(patch_mode=True)
+    state = {"current_code": CODE, "code_version": 1, "solutions": []}
+
+    update = reviewer._answer(state, AIMessage(answer(version)))
+
+    if applied:
+        assert update["code_version"] == 2
+        assert "assert add(1, 2) == 3" in update["current_code"]
+        assert "validation" not in update
+    else:
+        # the code is kept and the failure reported
+        assert "current_code" not in update and "code_version" not in update
+        assert update["validation"][-1]["stage"] == "patch"
+
+
+def test_patch_mode_graph(feature_graph, llm):
+    result = feature_graph(nb_juniors=2, patch_mode=True, validate=True).invoke(
+        "Add a test."
+    )
+
+    # the fake model answers with whole files: the juniors' diffs are rejected
+    # and the reviewer's code is taken as is
+    assert [v["stage"] for v in result["validation"]] == ["patch", "patch"]
+    assert result["code_version"] == 1
+    assert "def solution" in result["current_code"]
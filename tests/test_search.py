@@ -0,0 +1,39 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from AISoftTeam.search import CachedBackend, LocalIndexBackend, SearchCache
+
+DOCUMENTS = [
+    {"title": "numpy", "body": "image processing with numpy arrays"},
+    {"title": "networkx", "body": "graph of the pixels of an image"},
+]
+
+
+class SlowBackend(LocalIndexBackend):
+    def __init__(self, documents):
+        super().__init__(documents)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, max_results=10):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return super().search(query, max_results)
+
+
+def test_concurrent_searches_share_one_backend_call(tmp_path):
+    backend = SlowBackend(DOCUMENTS)
+    cached = CachedBackend(backend, SearchCache(str(tmp_path / "search.sqlite")))
+    # the same query up to the case and the order of the keywords
+    queries = ["image graph", "Graph image", "image  graph"] * 2 + ["numpy"]
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        results = list(pool.map(cached.search, queries))
+
+    assert backend.calls == 2
+    assert results[0] == results[1] == results[5] != results[6]
+    assert cached.cache.stats()["hits"] == 5
+    # the locks of the queries are dropped once their searches are done
+    assert not cached._query_locks
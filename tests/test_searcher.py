@@ -0,0 +1,57 @@
+import pytest
+
+from AISoftTeam.search import LocalIndexBackend
+
+QUESTION = "Build the similarity graph of the pixels of an image."
+
+
+class Spy:
+    """Runnable recording which of its methods are called."""
+
+    def __init__(self, runnable):
+        self.runnable = runnable
+        self.calls = []
+
+    def invoke(self, *args, **kwargs):
+        self.calls.append("invoke")
+        return self.runnable.invoke(*args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        self.calls.append("stream")
+        return self.runnable.stream(*args, **kwargs)
+
+
+@pytest.fixture
+def searcher(server, llm, tmp_path, monkeypatch):
+    """Factory of Searchers talking to the fake server, with a response cache."""
+    from AISoftTeam.agents.webscraper import Searcher
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "output").mkdir()
+    monkeypatch.setenv("OLLAMA_BASE_URL", server.url)
+    monkeypatch.setenv("SEARCHER_MODEL", "fake")
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+
+    def build(**kwargs):
+        searcher = Searcher(search_backend=LocalIndexBackend([]), **kwargs)
+        searcher.researcher_llm = Spy(searcher.researcher_llm)
+        return searcher
+
+    return build
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_searches_are_cached(searcher, llm, stream):
+    agent = searcher(stream=stream)
+    first = list(agent._web_searches(QUESTION))
+    assert llm.stats()["requests"] == 1
+    assert agent.researcher_llm.calls == ["stream" if stream else "invoke"]
+    assert len(first) == 5
+
+    llm.reset()
+    # the cache is shared by the streamed and the non streamed calls
+    agent = searcher(stream=not stream)
+    second = list(agent._web_searches(QUESTION))
+    assert llm.stats()["requests"] == 0
+    assert agent.researcher_llm.calls == ["invoke"]
+    assert second == first
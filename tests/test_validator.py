@@ -0,0 +1,29 @@
+import asyncio
+
+from src.agents.validator import Validator
+
+CODE = "def add(a, b):\n    return a + b\n"
+VALID = "```python\nassert add(1, 2) == 3\n```"
+FAILING = "```python\nassert add(1, 2) == 4\n```"
+INVALID = "```python\ndef broken(:\n```"
+
+
+def test_validation():
+    validator = Validator(max_workers=2)
+    state = {"current_code": CODE, "solutions": [VALID, FAILING, INVALID, "none"]}
+
+    results = validator.invoke(state)["validation"]
+    validator.close()
+
+    assert [r["ok"] for r in results] == [True, False, False, False]
+    assert [r["stage"] for r in results] == [None, "run", "parse", "extract"]
+
+
+def test_async_validation():
+    validator = Validator()
+    state = {"current_code": CODE, "solutions": [VALID, FAILING]}
+
+    results = asyncio.run(validator.ainvoke(state))["validation"]
+    validator.close()
+
+    assert [r["ok"] for r in results] == [True, False]